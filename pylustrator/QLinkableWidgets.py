@@ -276,8 +276,11 @@ class Linkable:
             fig = main_figure(element)
 
         save_change(element)
-        fig.change_tracker.addEdit([undo, redo, "Change property"])
-        fig.canvas.draw()
+        fig.change_tracker.addEdit(
+            [undo, redo, "Change property"],
+            merge_key=(tuple(elements), self.property_name),
+        )
+        fig.canvas.draw_idle()
         main_figure(self.element).signals.figure_selection_property_changed.emit()
 
     def set(self, value):
@@ -71,12 +71,16 @@ keys_for_lines = {}
 
 no_save_allowed = False
 setting_use_global_variable_names = False
+setting_render_cache = False
 old_pltshow: Optional[Any] = None
 old_pltfigure: Optional[Any] = None
 
 
 def initialize(
-    use_global_variable_names=False, use_exception_silencer=False, disable_save=False
+    use_global_variable_names=False,
+    use_exception_silencer=False,
+    disable_save=False,
+    render_cache=False,
 ):
     """
     This will overload the commands ``plt.figure()`` and ``plt.show()``.
@@ -90,6 +94,9 @@ def initialize(
     ---------
     use_global_variable_names : bool, optional
         if used, try to find global variables that reference a figure and use them in the generated code.
+    render_cache : bool, optional
+        if used, only the axes that changed since the last draw are rendered again and the image of the other axes
+        is reused. This speeds up edits of figures with many axes.
     """
     global \
         app, \
@@ -97,6 +104,7 @@ def initialize(
         old_pltshow, \
         old_pltfigure, \
         setting_use_global_variable_names, \
+        setting_render_cache, \
         no_save_allowed
 
     # remember line-numbers where texts are created
@@ -161,6 +169,7 @@ def initialize(
         )
 
     setting_use_global_variable_names = use_global_variable_names
+    setting_render_cache = render_cache
 
     if use_exception_silencer:
         swallow_get_exceptions()
@@ -222,6 +231,7 @@ def pyl_show(hide_window: bool = False) -> None:
         warnAboutTicks(fig)
         # set up window canvas, which initializes figure._pyl_scene
         window.setFigure(fig)
+        fig.canvas.render_cache = setting_render_cache
         # add dragger (ChangeTracker.load() sets is_new_text on texts from generated code)
         DragManager(fig, no_save_allowed)
         # initialize figure defaults AFTER load, so is_new_text is properly set
@@ -257,6 +267,7 @@ def show(*args, **kwargs) -> None:
         # window = _pylab_helpers.Gcf.figs[figure].canvas.window_pylustrator
         window = PlotWindow()
         window.setFigure(_pylab_helpers.Gcf.figs[figure].canvas.figure)
+        window.fig.canvas.render_cache = setting_render_cache
         # warn about ticks not fitting tick labels
         warnAboutTicks(window.fig)
         # add dragger (ChangeTracker.load() sets is_new_text on texts from generated code)
@@ -26,6 +26,7 @@ class PylustatorFigure(Protocol):
     ax_dict: Dict[str, "Axes"]
     _pyl_scene: Any
     _pyl_graphics_scene_snapparent: Any
+    _pyl_snap_path_pool: List[Any]
     color_artists: List[Any]
     _variable_name: Optional[str]
     _last_saved_figure: List[tuple]
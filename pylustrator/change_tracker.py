@@ -19,10 +19,13 @@
 # You should have received a copy of the GNU General Public License
 # along with Pylustrator. If not, see <http://www.gnu.org/licenses/>
 
+import io
+import os
 import re
 import sys
+import time
 import traceback
-from typing import IO, Optional, Dict, Tuple, Callable
+from typing import Any, Optional, Dict, Tuple, Callable, Set
 from packaging import version
 
 import numpy as np
@@ -37,6 +40,7 @@ from matplotlib.legend import Legend
 from matplotlib.collections import Collection
 from matplotlib.patches import Patch
 from matplotlib.lines import Line2D
+from matplotlib.ticker import AutoLocator
 
 try:
     from matplotlib.figure import SubFigure  # since matplotlib 3.4.0
@@ -44,12 +48,16 @@ except ImportError:
     SubFigure = None  # type: ignore[assignment]
 
 try:
-    from natsort import natsorted
+    from natsort import natsort_keygen
+
+    natsort_key: Callable = natsort_keygen()
 except ImportError:
-    natsorted: Callable = sorted
+
+    def natsort_key(x):
+        return x
 
 from .exception_swallower import Dummy
-from .jupyter_cells import open
+from .jupyter_cells import open, writeFileAtomic, isJupyterCell
 from .helper_functions import main_figure
 
 """ External overload """
@@ -112,10 +120,48 @@ def to_str(v):
     return repr(v)
 
 
+# the properties of texts and axes that are stored
+text_properties = [
+    "position",
+    "text",
+    "ha",
+    "va",
+    "fontsize",
+    "color",
+    "style",
+    "weight",
+    "fontname",
+    "rotation",
+]
+axes_properties = [
+    "position",
+    "xscale",
+    "xlabel",
+    "xticks",
+    "xticklabels",
+    "xlim",
+    "yscale",
+    "ylabel",
+    "yticks",
+    "yticklabels",
+    "ylim",
+    "zorder",
+]
+
+
 def kwargs_to_string(kwargs):
     return ", ".join(f"{k}={to_str(v)}" for k, v in kwargs.items())
 
 
+def mergeRestoreCalls(calls: list, newer_calls: list) -> list:
+    """merge two lists of setter calls, for the same setter of an element the newer call is used"""
+    # the calls are (element, target, function name, args, kwargs)
+    merged = {call[:3]: call for call in calls}
+    for call in newer_calls:
+        merged[call[:3]] = call
+    return list(merged.values())
+
+
 class UndoRedo:
     def __init__(self, elements, name):
         self.elements = list(elements)
@@ -126,15 +172,36 @@ class UndoRedo:
 
     def __enter__(self):
         if len(self.elements):
-            self.undo = self.change_tracker.get_element_restore_function(self.elements)
+            self.undo_calls = self.change_tracker.get_element_properties(self.elements)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if len(self.elements):
-            self.redo = self.change_tracker.get_element_restore_function(self.elements)
+            redo_calls = self.change_tracker.get_element_properties(self.elements)
+            undo_calls = self.undo_calls
+            # only keep the calls that changed
+            if len(undo_calls) == len(redo_calls):
+                changed = [
+                    (undo_call, redo_call)
+                    for undo_call, redo_call in zip(undo_calls, redo_calls)
+                    if undo_call[1] is not redo_call[1]
+                    or to_str(undo_call[2:]) != to_str(redo_call[2:])
+                ]
+                undo_calls = [undo_call for undo_call, _ in changed]
+                redo_calls = [redo_call for _, redo_call in changed]
+            self.undo = self.change_tracker.get_element_restore_function(
+                calls=undo_calls
+            )
+            self.redo = self.change_tracker.get_element_restore_function(
+                calls=redo_calls
+            )
             self.redo()
-            self.figure.canvas.draw()
+            self.figure.canvas.draw_idle()
             self.figure.signals.figure_selection_property_changed.emit()
-            self.change_tracker.addEdit([self.undo, self.redo, self.name])
+            # the calls allow to merge the edit with edits of other setters
+            self.change_tracker.addEdit(
+                [self.undo, self.redo, self.name, (undo_calls, redo_calls)],
+                merge_key=(tuple(self.elements), self.name),
+            )
 
 
 def init_figure(fig):
@@ -240,6 +307,228 @@ def add_axes_default(element):
     add_text_default(element.get_yaxis().get_label())
 
 
+class ReferenceCache:
+    """reverse lookup tables from the texts and axes of a (sub)figure to their code references.
+
+    Every entry stores where the artist was found, so that a cache hit can be verified directly. If the artist
+    moved (e.g. artists were added, removed or reordered) the tables are rebuilt. Artists that are not found
+    (e.g. the texts of inset axes) are stored as misses until the structure of the figure changes.
+    """
+
+    def __init__(self, figure: Figure | SubFigure):
+        self.figure = figure
+        self.texts = {}
+        self.axes = {}
+        self.axes_labels = None
+        self.missing = set()
+        self.structure = None
+        self.label_callbacks = []
+
+    def invalidate(self):
+        """drop the lookup tables, they are rebuilt on the next lookup"""
+        self.texts = {}
+        self.axes = {}
+        self.axes_labels = None
+        self.missing = set()
+        self.structure = None
+        for ax, oid in self.label_callbacks:
+            ax.remove_callback(oid)
+        self.label_callbacks = []
+
+    def get_structure(self) -> tuple:
+        """the number of children and ticks of the axes, a change invalidates the stored misses"""
+        return (
+            len(self.figure.texts),
+            tuple(
+                (
+                    ax,
+                    len(getattr(ax, "_children", ax.texts)),
+                    len(ax.xaxis.majorTicks),
+                    len(ax.xaxis.minorTicks),
+                    len(ax.yaxis.majorTicks),
+                    len(ax.yaxis.minorTicks),
+                )
+                for ax in self.figure.axes
+            ),
+        )
+
+    def is_missing(self, element: Artist) -> bool:
+        """if the element was not found by the last build and the figure did not change since"""
+        return element in self.missing and self.structure == self.get_structure()
+
+    def axes_changed(self, ax: Axes):
+        """invalidate the tables if the label of an axes changed, as the labels define the ax_dict references"""
+        if self.axes_labels is not None and ax.get_label() != self.axes[ax][2]:
+            self.invalidate()
+
+    def check_axes_labels(self):
+        """invalidate the tables if the labels of the axes changed, as they define the ax_dict references"""
+        if self.axes_labels != tuple(ax.get_label() for ax in self.figure.axes):
+            self.invalidate()
+
+    def build(self):
+        """build the lookup tables for all texts and axes of the figure"""
+        self.invalidate()
+        figure_axes = self.figure.axes
+        self.structure = self.get_structure()
+
+        labels = [ax.get_label() for ax in figure_axes]
+        self.axes_labels = tuple(labels)
+        for index, (ax, label) in enumerate(zip(figure_axes, labels)):
+            if label and labels.count(label) == 1:
+                path = '.ax_dict["%s"]' % escape_string(label)
+            else:
+                path = ".axes[%d]" % index
+            self.axes[ax] = (path, index, label)
+            self.label_callbacks.append((ax, ax.add_callback(self.axes_changed)))
+
+        def add(text, parent, path, owner, list_name, index, attribute_name):
+            # do not overwrite entries, the first found reference is used
+            if text is not None and text not in self.texts:
+                self.texts[text] = (
+                    parent,
+                    path,
+                    owner,
+                    list_name,
+                    index,
+                    attribute_name,
+                )
+
+        for ax in figure_axes:
+            for index, text in enumerate(ax.texts):
+                add(text, ax, ".texts[%d]" % index, ax, "texts", index, None)
+            for attribute_name in ["title", "_left_title", "_right_title"]:
+                text = getattr(ax, attribute_name, None)
+                add(text, ax, "." + attribute_name, ax, None, None, attribute_name)
+        for index, text in enumerate(self.figure.texts):
+            add(
+                text, self.figure, ".texts[%d]" % index, self.figure, "texts", index, None
+            )
+        for ax in figure_axes:
+            for axis_name in ["x", "y"]:
+                axis = getattr(ax, f"get_{axis_name}axis")()
+                path = f".get_{axis_name}axis().get_label()"
+                add(axis.get_label(), ax, path, axis, None, None, "label")
+        for axis_name in ["x", "y"]:
+            for ax in figure_axes:
+                axis = getattr(ax, f"get_{axis_name}axis")()
+                for tick_type in ["major", "minor"]:
+                    ticks = getattr(axis, f"get_{tick_type}_ticks")()
+                    for index, tick in enumerate(ticks):
+                        for label_name in ["label1", "label2"]:
+                            path = f".get_{axis_name}axis().get_{tick_type}_ticks()[{index}].{label_name}"
+                            add(
+                                getattr(tick, label_name),
+                                ax,
+                                path,
+                                axis,
+                                f"{tick_type}Ticks",
+                                index,
+                                label_name,
+                            )
+
+    def get_text(
+            self, element: Text
+    ) -> Optional[Tuple[Artist | Figure | SubFigure, str]]:
+        """get the parent object and the code path relative to the parent for a text"""
+        for rebuild in [False, True]:
+            if rebuild:
+                if self.is_missing(element):
+                    return None
+                self.build()
+            entry = self.texts.get(element)
+            if entry is None:
+                continue
+            parent, path, owner, list_name, index, attribute_name = entry
+            # check that the text is still at the stored position
+            target = owner
+            if list_name is not None:
+                items = getattr(owner, list_name)
+                if index >= len(items):
+                    continue
+                target = items[index]
+            if attribute_name is not None:
+                target = getattr(target, attribute_name, None)
+            if target is element:
+                return parent, path
+        self.missing.add(element)
+        return None
+
+    def get_axes(self, element: Axes) -> Optional[str]:
+        """get the code path of an axes relative to its figure"""
+        for rebuild in [False, True]:
+            if rebuild:
+                if self.is_missing(element):
+                    return None
+                self.build()
+            entry = self.axes.get(element)
+            if entry is None:
+                continue
+            path, index, label = entry
+            figure_axes = self.figure.axes
+            # check that the axes is still at the stored position, a changed label of any axes
+            # already invalidated the tables (see axes_changed)
+            if len(figure_axes) == len(self.axes) and figure_axes[index] is element:
+                return path
+        self.missing.add(element)
+        return None
+
+
+def getReferenceCache(figure: Figure | SubFigure) -> ReferenceCache:
+    """get the reference cache of a (sub)figure"""
+    cache = getattr(figure, "_pylustrator_reference_cache", None)
+    if cache is None:
+        cache = ReferenceCache(figure)
+        setattr(figure, "_pylustrator_reference_cache", cache)
+    return cache
+
+
+def invalidateReferenceCache(figure: Figure | SubFigure):
+    """check the reference caches of a figure and its subfigures, e.g. before many references are resolved"""
+    getReferenceCache(figure).check_axes_labels()
+    for subfig in getattr(figure, "subfigs", []):
+        invalidateReferenceCache(subfig)
+
+
+def getArtistIndex(
+        container: Artist | Figure | SubFigure, list_name: str, element: Artist
+) -> int:
+    """get the index of an artist in an artist list (e.g. "lines") of an axes or figure.
+
+    The indices are stored per container and list and rebuilt when the length of the list changed. The artist
+    lists of axes are views on the plain list axes._children, its length and positions are used for the check.
+    """
+    items = getattr(container, list_name)
+    source = items if isinstance(items, list) else getattr(container, "_children", None)
+    if not isinstance(source, list):
+        source = list(items)
+
+    tables = getattr(container, "_pylustrator_artist_indices", None)
+    if tables is None:
+        tables = {}
+        setattr(container, "_pylustrator_artist_indices", tables)
+
+    entry = tables.get(list_name)
+    if entry is not None and entry[0] is source and entry[1] == len(source):
+        found = entry[2].get(element)
+        # the artist has to be still at the stored position, otherwise the list was reordered
+        if found is not None and source[found[1]] is element:
+            return found[0]
+
+    positions = {}
+    for position, artist in enumerate(source):
+        positions.setdefault(artist, position)
+    table = {}
+    for index, artist in enumerate(items):
+        if artist not in table:
+            table[artist] = (index, positions[artist])
+    tables[list_name] = (source, len(source), table)
+
+    if element not in table:
+        raise ValueError("%s is not in %s" % (element, list_name))
+    return table[element][0]
+
+
 def getReference(element: Artist | Figure | SubFigure, allow_using_variable_names=True):
     """get the code string that represents the given Artist."""
     if element is None:
@@ -263,22 +552,27 @@ def getReference(element: Artist | Figure | SubFigure, allow_using_variable_name
         axes = element.axes
         if not isinstance(axes, Axes):
             raise ValueError("element must be a matplotlib.axes.Axes instance")
-        index = axes.lines.index(element)
+        index = getArtistIndex(axes, "lines", element)
         return getReference(axes) + ".lines[%d]" % index
     if isinstance(element, Collection):
         axes = element.axes
         if not isinstance(axes, Axes):
             raise ValueError("element must be a matplotlib.axes.Axes instance")
-        index = axes.collections.index(element)
+        index = getArtistIndex(axes, "collections", element)
         return getReference(axes) + ".collections[%d]" % index
     if isinstance(element, Patch):
         if element.axes:
-            index = element.axes.patches.index(element)
+            index = getArtistIndex(element.axes, "patches", element)
             return getReference(element.axes) + ".patches[%d]" % index
-        index = element.figure.patches.index(element)
+        index = getArtistIndex(element.figure, "patches", element)
         return getReference(element.figure) + ".patches[%d]" % (index)
 
     if isinstance(element, Text):
+        found = getReferenceCache(element.figure).get_text(element)
+        if found is not None:
+            parent, path = found
+            return getReference(parent) + path
+        # texts of axes that are not part of figure.axes (e.g. inset axes)
         if element.axes:
             try:
                 index = element.axes.texts.index(element)
@@ -286,80 +580,13 @@ def getReference(element: Artist | Figure | SubFigure, allow_using_variable_name
                 for attribute_name in ["title", "_left_title", "_right_title"]:
                     if getattr(element.axes, attribute_name, None) == element:
                         return getReference(element.axes) + "." + attribute_name
-                pass
             else:
                 return getReference(element.axes) + ".texts[%d]" % index
-        try:
-            index = element.figure.texts.index(element)
-            return getReference(element.figure) + ".texts[%d]" % (index)
-        except ValueError:
-            pass
-        for axes in element.figure.axes:
-            if element == axes.get_xaxis().get_label():
-                return getReference(axes) + ".get_xaxis().get_label()"
-            if element == axes.get_yaxis().get_label():
-                return getReference(axes) + ".get_yaxis().get_label()"
-
-            for index, label in enumerate(axes.get_xaxis().get_major_ticks()):
-                if element == label.label1:
-                    return (
-                            getReference(axes)
-                            + ".get_xaxis().get_major_ticks()[%d].label1" % index
-                    )
-                if element == label.label2:
-                    return (
-                            getReference(axes)
-                            + ".get_xaxis().get_major_ticks()[%d].label2" % index
-                    )
-            for index, label in enumerate(axes.get_xaxis().get_minor_ticks()):
-                if element == label.label1:
-                    return (
-                            getReference(axes)
-                            + ".get_xaxis().get_minor_ticks()[%d].label1" % index
-                    )
-                if element == label.label2:
-                    return (
-                            getReference(axes)
-                            + ".get_xaxis().get_minor_ticks()[%d].label2" % index
-                    )
-
-            for axes in element.figure.axes:
-                for index, label in enumerate(axes.get_yaxis().get_major_ticks()):
-                    if element == label.label1:
-                        return (
-                                getReference(axes)
-                                + ".get_yaxis().get_major_ticks()[%d].label1" % index
-                        )
-                    if element == label.label2:
-                        return (
-                                getReference(axes)
-                                + ".get_yaxis().get_major_ticks()[%d].label2" % index
-                        )
-                for index, label in enumerate(axes.get_yaxis().get_minor_ticks()):
-                    if element == label.label1:
-                        return (
-                                getReference(axes)
-                                + ".get_yaxis().get_minor_ticks()[%d].label1" % index
-                        )
-                    if element == label.label2:
-                        return (
-                                getReference(axes)
-                                + ".get_yaxis().get_minor_ticks()[%d].label2" % index
-                        )
 
     if isinstance(element, Axes):
-        if element.get_label():
-
-            def check_fig_has_label(fig):
-                for ax in element.figure.axes:
-                    if ax != element and ax.get_label() == element.get_label():
-                        return True
-                return False
-
-            if not check_fig_has_label(element.figure):
-                return getReference(element.figure) + '.ax_dict["%s"]' % escape_string(
-                    element.get_label()
-                )
+        path = getReferenceCache(element.figure).get_axes(element)
+        if path is not None:
+            return getReference(element.figure) + path
         index = element.figure.axes.index(element)
         return getReference(element.figure) + ".axes[%d]" % index
 
@@ -385,12 +612,91 @@ def setFigureVariableNames(figure: Figure):
         setattr(mpl_figure, "_variable_name", fig_names[0])
 
 
+# the figure a reference starts with, either plt.figure(...) or the variable name of the figure
+reference_figure_pattern = r"plt\.figure\([^)]*\)|[A-Za-z_]\w*"
+# the steps from the figure to the element:
+# an item of a list, an axes by label, a tick, an axis label or the legend
+reference_part_pattern = (
+    r"\.(subfigs|axes|texts|lines|collections|patches)\[(\d+)\]"
+    r'|\.ax_dict\["((?:[^"\\]|\\.)*)"\]'
+    r"|\.get_([xy])axis\(\)\.get_(major|minor)_ticks\(\)\[(\d+)\]"
+    r"|\.get_([xy])axis\(\)\.get_label\(\)"
+    r"|\.(get_legend)\(\)"
+)
+reference_figure_regex = re.compile(reference_figure_pattern)
+reference_part_regex = re.compile(reference_part_pattern)
+# a line of generated code: the reference (matched atomically with a lookahead, so it
+# takes all the parts it can), the command and its parameters, which end with the id of
+# the element for new elements
+code_line_regex = re.compile(
+    r"(?=(?P<reference>(?:%s)(?:%s)*))(?P=reference)"
+    r"(?P<command>\.[^(= ]*)(?P<parameter>(?:.*# id=(?P<id>.*))?.*)"
+    % (reference_figure_pattern, reference_part_pattern)
+)
+
+
+def parseCodeLine(line: str) -> Optional[Tuple[str, str, str, Optional[str]]]:
+    """split a line of generated code into the reference of the object, the command, the parameters and the id"""
+    match = code_line_regex.match(line)
+    if match is None:
+        return None
+    return match.group("reference", "command", "parameter", "id")
+
+
+def resolveReference(reference: str, figure: Figure) -> Any:
+    """get the object a reference string refers to by walking along its parts instead of evaluating it"""
+    match = reference_figure_regex.match(reference)
+    if match is None:
+        raise ValueError("Could not resolve reference: %s" % reference)
+    name = match.group()
+    if name == getReference(figure) or name == getReference(
+        figure, allow_using_variable_names=False
+    ):
+        element = figure
+    elif isinstance(globals().get(name), Figure):
+        element = globals()[name]
+    else:
+        for manager in _pylab_helpers.Gcf.get_all_fig_managers():
+            reference_figure = manager.canvas.figure
+            if getReference(reference_figure, allow_using_variable_names=False) == name:
+                element = reference_figure
+                break
+        else:
+            raise ValueError("Could not resolve reference: %s" % reference)
+
+    position = match.end()
+    while position < len(reference):
+        match = reference_part_regex.match(reference, position)
+        if match is None:
+            raise ValueError("Could not resolve reference: %s" % reference)
+        list_name, index, label, axis, ticks, tick_index, label_axis, _ = match.groups()
+        if list_name is not None:
+            element = getattr(element, list_name)[int(index)]
+        elif label is not None:
+            element = element.ax_dict[unescape_string(label)]
+        elif axis is not None:
+            axis_object = getattr(element, "get_%saxis" % axis)()
+            element = getattr(axis_object, "get_%s_ticks" % ticks)()[int(tick_index)]
+        elif label_axis is not None:
+            element = getattr(element, "get_%saxis" % label_axis)().get_label()
+        else:
+            element = element.get_legend()
+        position = match.end()
+    return element
+
+
 class ChangeTracker:
     """a class that records a list of the change to the figure"""
 
     changes: Dict[Tuple[Artist, str], Tuple[Artist, str]]
+    element_changes: Dict[Artist, Set[str]]
     saved = True
 
+    # the maximal number of edits kept for undo (None for no limit)
+    max_edits: Optional[int] = 1000
+    # the time in seconds in which consecutive edits of the same property are merged
+    edit_merge_time: float = 1.0
+
     update_changes_signal = None
 
     def __init__(self, figure: Figure, no_save):
@@ -400,8 +706,18 @@ class ChangeTracker:
         self.figure: Figure = figure
         self.edits = []
         self.last_edit = -1
+        self.last_edit_merge_key = None
+        self.last_edit_time = 0.0
         self.changes: Dict[Tuple[Artist, str], Tuple[Artist, str]] = {}
+        # index of the reference commands stored in self.changes for every reference object
+        self.element_changes: Dict[Artist, Set[str]] = {}
+        # the rendered code lines of the changes and the changes that need to be rendered again
+        self.rendered_changes: Dict[Tuple[Artist, str], Tuple[Any, str]] = {}
+        self.dirty_changes: Set[Tuple[Artist, str]] = set()
+        self.rendered_signature = None
         self.no_save = no_save
+        # the changes of an open transaction (e.g. a drag), they are recorded on commit
+        self.transaction: Optional[Dict[tuple, tuple]] = None
 
         # make all the subplots pickable
         for index, axes in enumerate(self.figure.axes):
@@ -435,36 +751,214 @@ class ChangeTracker:
                 (reference_command,) = match.groups()
             else:
                 raise ValueError("command must start with .")
-        self.changes[reference_obj, reference_command] = (command_obj, command)
+        if self.transaction is not None:
+            self.transaction[self.addChange, reference_obj, reference_command] = (
+                command_obj,
+                command,
+                reference_obj,
+                reference_command,
+            )
+            return
+        self.setChange(reference_obj, reference_command, command_obj, command)
         self.saved = False
         self.changeCountChanged()
 
-    def get_element_restore_function(self, elements):
-        description_strings = []
+    def beginTransaction(self):
+        """open a transaction, changes are only collected until commitTransaction is called"""
+        if self.transaction is None:
+            self.transaction = {}
+
+    def commitTransaction(self):
+        """record the changes of the open transaction once, with the current state of the elements"""
+        transaction = self.transaction
+        self.transaction = None
+        if not transaction:
+            return
+        for (function, *_), args in transaction.items():
+            function(*args)
+
+    def setChange(
+            self,
+            reference_obj: Artist,
+            reference_command: str,
+            command_obj: Artist,
+            command: str,
+    ):
+        """store a change and add it to the index of changes of the reference object"""
+        self.changes[reference_obj, reference_command] = (command_obj, command)
+        self.element_changes.setdefault(reference_obj, set()).add(reference_command)
+        self.dirty_changes.add((reference_obj, reference_command))
+        # the cached extent of the changed artist is no longer valid
+        if getattr(reference_obj, "_pylustrator_cached_get_extend", None) is not None:
+            reference_obj._pylustrator_cached_get_extend = None
+        # the extent of the changed artist has to be updated in the spatial index
+        spatial_index = getattr(self.figure, "_pylustrator_spatial_index", None)
+        if spatial_index is not None:
+            spatial_index.invalidate(reference_obj)
+
+    def removeChange(self, reference_obj: Artist, reference_command: str):
+        """remove a single change, if it exists"""
+        self.changes.pop((reference_obj, reference_command), None)
+        self.rendered_changes.pop((reference_obj, reference_command), None)
+        commands = self.element_changes.get(reference_obj)
+        if commands is not None:
+            commands.discard(reference_command)
+            if not commands:
+                del self.element_changes[reference_obj]
+
+    def removeElementChanges(self, element: Artist):
+        """remove all changes that refer to the given element"""
+        for reference_command in self.element_changes.pop(element, ()):
+            del self.changes[element, reference_command]
+            self.rendered_changes.pop((element, reference_command), None)
+
+    def get_element_properties(self, elements) -> list:
+        """get the current state of the elements as a list of setter calls that restore it.
+
+        Every entry is (element, target, function name, args, kwargs), where target is the object the setter is
+        called on (e.g. the axes for a legend or a spine of an axes).
+        """
+        calls = []
         for element in elements:
-            desc = self.get_describtion_string(element, exclude_default=False)
-            if isinstance(desc, list):
-                description_strings.extend(desc)
-            else:
-                description_strings.append(desc)
+            if isinstance(element, Text):
+                # if the text is deleted we do not need to store all properties
+                if not element.get_visible() or element.get_text() == "":
+                    is_label = np.any(
+                        [
+                            ax.xaxis.get_label() == element
+                            or ax.yaxis.get_label() == element
+                            for ax in element.figure.axes
+                        ]
+                    )
+                    if is_label and not getattr(element, "is_new_text", False):
+                        calls.append((element, element, "set", (), {"text": ""}))
+                    else:
+                        calls.append((element, element, "set", (), {"visible": False}))
+                    continue
+                kwargs = {
+                    prop: getattr(element, f"get_{prop}")()
+                    for prop in text_properties
+                }
+                calls.append((element, element, "set", (), kwargs))
+            elif isinstance(element, Legend):
+                parent, kwargs = self.get_legend_kwargs(element, exclude_default=False)
+                calls.append((element, parent, "legend", (), kwargs))
+            elif isinstance(element, Axes):
+                kwargs = {}
+                for prop in axes_properties:
+                    kwargs[prop] = getattr(element, f"get_{prop}")()
+                pos = element.get_position()
+                kwargs["position"] = [pos.x0, pos.y0, pos.width, pos.height]
+                kwargs["xticks"] = list(kwargs["xticks"])
+                kwargs["xticklabels"] = [t.get_text() for t in kwargs["xticklabels"]]
+                kwargs["yticks"] = list(kwargs["yticks"])
+                kwargs["yticklabels"] = [t.get_text() for t in kwargs["yticklabels"]]
+                # ticks that are set by a locator are not stored
+                for axis_name in ["x", "y"]:
+                    axis = getattr(element, f"get_{axis_name}axis")()
+                    if (
+                            isinstance(axis.major.locator, AutoLocator)
+                            and element._pylustrator_old_args[axis_name + "ticks-locator"]
+                    ):
+                        del kwargs[f"{axis_name}ticks"]
+                        del kwargs[f"{axis_name}ticklabels"]
+                calls.append((element, element, "set", (), kwargs))
+
+                # the minor ticks
+                for axis_name in ["x", "y"]:
+                    ticks = getattr(element, f"get_{axis_name}ticks")(minor=True)
+                    labels = getattr(element, f"get_{axis_name}ticklabels")(minor=True)
+                    args = (list(ticks), [t.get_text() for t in labels])
+                    function_name = f"set_{axis_name}ticks"
+                    calls.append(
+                        (element, element, function_name, args, {"minor": True})
+                    )
+
+                # the grid
+                has_grid = (
+                        getattr(element.xaxis, "_gridOnMajor", False)
+                        or getattr(element.xaxis, "_major_tick_kw", {"gridOn": False})["gridOn"]
+                )
+                calls.append((element, element, "grid", (has_grid,), {}))
+
+                # the spines
+                for spine in element.spines.values():
+                    args = (spine.get_visible(),)
+                    calls.append((element, spine, "set_visible", args, {}))
+        return calls
+
+    def get_element_restore_function(self, elements=None, calls=None):
+        """get a function that restores the current state of the elements (or the state given by the calls)"""
+        if calls is None:
+            calls = self.get_element_properties(elements)
 
         def restore():
-            for element, string in description_strings:
-                # function, arguments = re.match(r"\.([^(]*)\((.*)\)", string)
-                print(f"eval {getReference(element)}{string}")
-                eval(f"{getReference(element)}{string}")
+            changed_elements = []
+            for element, target, function_name, args, kwargs in calls:
+                getattr(target, function_name)(*args, **kwargs)
+                if element not in changed_elements:
+                    changed_elements.append(element)
+
+            # store the changes of every element once
+            for element in changed_elements:
                 if isinstance(element, Text):
                     self.addNewTextChange(element)
-                elif isinstance(element, Axes) and string.startswith(".legend("):
-                    self.addNewLegendChange(element.get_legend())
+                elif isinstance(element, Legend):
+                    parent = element.figure if element.axes is None else element.axes
+                    self.addNewLegendChange(parent.get_legend())
                 elif isinstance(element, Axes):
                     self.addNewAxesChange(element)
                 else:
                     raise NotImplementedError
-                # getattr(element, function)(eval(arg))
 
         return restore
 
+    def get_legend_kwargs(self, element: Legend, exclude_default=True):
+        """get the parent of the legend and the arguments to create it"""
+        ncols_name = "ncols"
+        if version.parse(mpl.__version__) < version.parse("3.6.0"):
+            ncols_name = "ncol"
+
+        property_names = [
+            ("frameon", lambda x: x.get_frame_on()),
+            ("borderpad", lambda x: x.borderpad),
+            ("labelspacing", lambda x: x.labelspacing),
+            ("markerscale", lambda x: x.markerscale),
+            ("handlelength", lambda x: x.handlelength),
+            ("handletextpad", lambda x: x.handletextpad),
+            (ncols_name, lambda x: getattr(x, "_" + ncols_name)),
+            ("columnspacing", lambda x: x.columnspacing),
+            ("fontsize", lambda x: x._fontsize),
+            ("title", lambda x: x.get_title().get_text()),
+            ("title_fontsize", lambda x: x.get_title().get_fontsize()),
+        ]
+
+        # get current property values
+        kwargs = {"loc": element._loc}
+        for prop, func in property_names:
+            value = func(element)
+            try:
+                default = plt.rcParams["legend." + prop]
+            except KeyError:
+                if prop == "title":
+                    default = ""
+                elif prop == ncols_name:
+                    default = 1
+                else:
+                    default = None
+                pass
+            if (prop == "fontsize" or prop == "title_fontsize") and (
+                    default == "medium" or default is None
+            ):
+                if value == plt.rcParams["font.size"]:
+                    continue
+            if prop == "title_fontsize" and "title" not in kwargs:
+                continue
+            if value != default or not exclude_default:
+                kwargs[prop] = value
+        parent = element.figure if element.axes is None else element.axes
+        return parent, kwargs
+
     def get_describtion_string(self, element, exclude_default=True):
         if isinstance(element, Text):
             # if the text is deleted we do not need to store all properties
@@ -486,23 +980,9 @@ class ChangeTracker:
                         return element, ".set(text='')"
                     return element, ".set(visible=False)"
 
-            # properties to store
-            properties = [
-                "position",
-                "text",
-                "ha",
-                "va",
-                "fontsize",
-                "color",
-                "style",
-                "weight",
-                "fontname",
-                "rotation",
-            ]
-
             # get current property values
             kwargs = {}
-            for prop in properties:
+            for prop in text_properties:
                 value = getattr(element, f"get_{prop}")()
                 default = element._pylustrator_old_args[prop]
                 if to_str(default) != to_str(value) or not exclude_default:
@@ -530,68 +1010,12 @@ class ChangeTracker:
                 kwargs = kwargs_to_string(kwargs)
                 return element, f".set({kwargs})"
         elif isinstance(element, Legend):
-            ncols_name = "ncols"
-            if version.parse(mpl.__version__) < version.parse("3.6.0"):
-                ncols_name = "ncol"
-
-            property_names = [
-                ("frameon", lambda x: x.get_frame_on()),
-                ("borderpad", lambda x: x.borderpad),
-                ("labelspacing", lambda x: x.labelspacing),
-                ("markerscale", lambda x: x.markerscale),
-                ("handlelength", lambda x: x.handlelength),
-                ("handletextpad", lambda x: x.handletextpad),
-                (ncols_name, lambda x: getattr(x, "_" + ncols_name)),
-                ("columnspacing", lambda x: x.columnspacing),
-                ("fontsize", lambda x: x._fontsize),
-                ("title", lambda x: x.get_title().get_text()),
-                ("title_fontsize", lambda x: x.get_title().get_fontsize()),
-            ]
-
-            # get current property values
-            kwargs = {"loc": element._loc}
-            for prop, func in property_names:
-                value = func(element)
-                try:
-                    default = plt.rcParams["legend." + prop]
-                except KeyError:
-                    if prop == "title":
-                        default = ""
-                    elif prop == ncols_name:
-                        default = 1
-                    else:
-                        default = None
-                    pass
-                if (prop == "fontsize" or prop == "title_fontsize") and (
-                        default == "medium" or default is None
-                ):
-                    if value == plt.rcParams["font.size"]:
-                        continue
-                if prop == "title_fontsize" and "title" not in kwargs:
-                    continue
-                if value != default or not exclude_default:
-                    kwargs[prop] = value
-            parent = element.figure if element.axes is None else element.axes
+            parent, kwargs = self.get_legend_kwargs(element, exclude_default)
             return parent, f".legend({kwargs_to_string(kwargs)})"
         elif isinstance(element, Axes):
-            properties = [
-                "position",
-                "xscale",
-                "xlabel",
-                "xticks",
-                "xticklabels",
-                "xlim",
-                "yscale",
-                "ylabel",
-                "yticks",
-                "yticklabels",
-                "ylim",
-                "zorder",
-            ]
-
             # get current property values
             kwargs = {}
-            for prop in properties:
+            for prop in axes_properties:
                 value = getattr(element, f"get_{prop}")()
                 # if self.text_properties_defaults[prop] != value or not exclude_default:
                 kwargs[prop] = value
@@ -610,8 +1034,6 @@ class ChangeTracker:
             kwargs["yticklabels-minor"] = [
                 t.get_text() for t in element.get_yticklabels(minor=True)
             ]
-            from matplotlib.ticker import AutoLocator
-
             if 0:
                 if element.get_autoscale_on():
                     del kwargs["xlim"]
@@ -643,7 +1065,7 @@ class ChangeTracker:
             desc_strings = [
                 (
                     element,
-                    f".set({kwargs_to_string({k: v for k, v in kwargs.items() if k in properties})})",
+                    f".set({kwargs_to_string({k: v for k, v in kwargs.items() if k in axes_properties})})",
                 )
             ]
 
@@ -708,13 +1130,13 @@ class ChangeTracker:
     text_properties_defaults = None
 
     def addNewTextChange(self, element):
+        if self.transaction is not None:
+            self.transaction[self.addNewTextChange, element] = (element,)
+            return
         command_parent, command = self.get_describtion_string(element)
 
         # make sure there are no old changes to this element
-        keys = [k for k in self.changes]
-        for reference_obj, reference_command in keys:
-            if reference_obj == element:
-                del self.changes[reference_obj, reference_command]
+        self.removeElementChanges(element)
 
         # store the changes
         if getattr(element, "is_new_text", False):
@@ -729,13 +1151,13 @@ class ChangeTracker:
             main_figure(element).change_tracker.addChange(command_parent, command)
 
     def addNewLegendChange(self, element):
+        if self.transaction is not None:
+            self.transaction[self.addNewLegendChange, element] = (element,)
+            return
         command_parent, command = self.get_describtion_string(element)
 
         # make sure there are no old changes to this element
-        keys = [k for k in self.changes]
-        for reference_obj, reference_command in keys:
-            if reference_obj == element:
-                del self.changes[reference_obj, reference_command]
+        self.removeElementChanges(element)
 
         # store the changes
         # if not element.get_visible() and getattr(element, "is_new_text", False):
@@ -743,13 +1165,13 @@ class ChangeTracker:
         main_figure(element).change_tracker.addChange(command_parent, command)
 
     def addNewAxesChange(self, element):
+        if self.transaction is not None:
+            self.transaction[self.addNewAxesChange, element] = (element,)
+            return
         desc_strings = self.get_describtion_string(element)
 
         # make sure there are no old changes to this element
-        keys = [k for k in self.changes]
-        for reference_obj, reference_command in keys:
-            if reference_obj == element:
-                del self.changes[reference_obj, reference_command]
+        self.removeElementChanges(element)
 
         # store the changes
         # if not element.get_visible() and getattr(element, "is_new_text", False):
@@ -782,10 +1204,7 @@ class ChangeTracker:
         # create_key = key+".new"
         created_by_pylustrator = (element, ".new") in self.changes
         # delete changes related to this element
-        keys = [k for k in self.changes]
-        for reference_obj, reference_command in keys:
-            if reference_obj == element:
-                del self.changes[reference_obj, reference_command]
+        self.removeElementChanges(element)
         if not created_by_pylustrator or isinstance(element, Text):
             is_label = np.any(
                 [
@@ -822,12 +1241,44 @@ class ChangeTracker:
             element.remove()
         self.figure.selection.remove_target(element)
 
-    def addEdit(self, edit: list):
-        """add an edit to the stored list of edits"""
+    def addEdit(self, edit: list, merge_key: Any = None):
+        """add an edit to the stored list of edits.
+
+        Consecutive edits with the same merge_key (e.g. the same elements and property) that follow each other
+        within edit_merge_time are merged into one edit. Only the last max_edits edits are kept.
+        """
         if self.last_edit < len(self.edits) - 1:
             self.edits = self.edits[: self.last_edit + 1]
-        self.edits.append(edit)
-        self.last_edit = len(self.edits) - 1
+            self.last_edit_merge_key = None
+        now = time.monotonic()
+        if (
+                merge_key is not None
+                and merge_key == self.last_edit_merge_key
+                and now - self.last_edit_time < self.edit_merge_time
+                and len(self.edits)
+        ):
+            last_edit = self.edits[-1]
+            if len(last_edit) > 3 and len(edit) > 3:
+                # the edits can set different properties, undo restores the oldest and
+                # redo the newest value of every setter
+                undo_calls = mergeRestoreCalls(edit[3][0], last_edit[3][0])
+                redo_calls = mergeRestoreCalls(last_edit[3][1], edit[3][1])
+                self.edits[-1] = [
+                    self.get_element_restore_function(calls=undo_calls),
+                    self.get_element_restore_function(calls=redo_calls),
+                    edit[2],
+                    (undo_calls, redo_calls),
+                ]
+            else:
+                # keep the undo of the first edit and the redo of the new one
+                self.edits[-1] = [last_edit[0]] + list(edit[1:])
+        else:
+            self.edits.append(edit)
+        self.last_edit_merge_key = merge_key
+        self.last_edit_time = now
+        # drop the oldest edits
+        if self.max_edits is not None and len(self.edits) > self.max_edits:
+            del self.edits[: len(self.edits) - self.max_edits]
         self.last_edit = len(self.edits) - 1
         # print("addEdit", len(self.edits), self.last_edit)
         self.saved = False
@@ -835,25 +1286,29 @@ class ChangeTracker:
 
     def backEdit(self):
         """undo an edit in the list"""
+        self.commitTransaction()
         if self.last_edit < 0:
             # print("no backEdit", len(self.edits), self.last_edit)
             return
         edit = self.edits[self.last_edit]
         edit[0]()
         self.last_edit -= 1
-        self.figure.canvas.draw()
+        self.last_edit_merge_key = None
+        self.figure.canvas.draw_idle()
         # print("backEdit", len(self.edits), self.last_edit)
         self.changeCountChanged()
 
     def forwardEdit(self):
         """redo an edit"""
+        self.commitTransaction()
         if self.last_edit >= len(self.edits) - 1:
             # print("no forwardEdit", len(self.edits), self.last_edit)
             return
         edit = self.edits[self.last_edit + 1]
         edit[1]()
         self.last_edit += 1
-        self.figure.canvas.draw()
+        self.last_edit_merge_key = None
+        self.figure.canvas.draw_idle()
         # print("forwardEdit", len(self.edits), self.last_edit)
         self.changeCountChanged()
 
@@ -861,25 +1316,6 @@ class ChangeTracker:
         """load a set of changes from a script file. The changes are the code that pylustrator generated"""
         if stack_position is None:
             return
-        regex = re.compile(r"(\.[^\(= ]*)(.*)")
-        command_obj_regexes = [
-            getReference(self.figure),
-            r"plt\.figure\([^)]*\)",
-            r"fig",
-            r"\.subfigs\[\d*\]",
-            r"\.ax_dict\[\"[^\"]*\"\]",
-            r"\.axes\[\d*\]",
-            r"\.texts\[\d*\]",
-            r"\.{title|_left_title|_right_title}",
-            r"\.lines\[\d*\]",
-            r"\.collections\[\d*\]",
-            r"\.patches\[\d*\]",
-            r"\.get_[xy]axis\(\)\.get_(major|minor)_ticks\(\)\[\d*\]",
-            r"\.get_[xy]axis\(\)\.get_label\(\)",
-            r"\.get_legend\(\)",
-        ]
-        command_obj_regexes = [re.compile(r) for r in command_obj_regexes]
-
         # fig = self.figure
         header = []
         header += ["fig = plt.figure(%s)" % self.figure.number]
@@ -899,33 +1335,17 @@ class ChangeTracker:
                 lineno += 1
                 if line == "" or line in header or line.startswith("#"):
                     continue
-                if re.match(r".*\.ax_dict =.*", line):
+                if ".ax_dict =" in line:
                     continue
 
                 raw_line = line
 
-                # try to identify the command object of the line
-                command_obj = ""
-                for r in command_obj_regexes:
-                    while True:
-                        match = r.match(line)
-                        if match:
-                            found = match.group()
-                            line = line[len(found):]
-                            command_obj += found
-                        else:
-                            break
-
-                match = regex.match(line)
-                if match:
-                    command, parameter = match.groups()
-                else:
+                # split the line into the object, the command and its parameters
+                parsed = parseCodeLine(line)
+                if parsed is None:
                     raise ValueError("Could not parse line: %s" % line)
-
-                m = re.match(r".*# id=(.*)", line)
-                if m:
-                    key = m.groups()[0]
-                else:
+                command_obj, command, parameter, key = parsed
+                if key is None:
                     key = command_obj + command
 
                 # by default reference and command object are the same
@@ -938,7 +1358,7 @@ class ChangeTracker:
                         or command == ".set_xlabels"
                         or command == ".set_ylabels"
                 ):
-                    if line.find("minor=True") != -1:
+                    if parameter.find("minor=True") != -1:
                         reference_command = command + "_minor"
 
                 # for new created texts, the reference object is the text and not the axis/figure
@@ -950,7 +1370,7 @@ class ChangeTracker:
                     # for texts we stored the linenumbers where they were created
                     if command == ".text":
                         # get the parent object (usually an Axes)
-                        parent = eval(reference_obj)
+                        parent = resolveReference(reference_obj, self.figure)
                         # iterate over the texts
                         for t in parent.texts:
                             # and find if one of the texts was created in the line we are currently looking at
@@ -971,11 +1391,11 @@ class ChangeTracker:
                             reference_obj, _ = match.groups()
                     reference_command = ".new"
                     if command == ".text":
-                        eval(reference_obj).is_new_text = True
+                        resolveReference(reference_obj, self.figure).is_new_text = True
 
-                command_obj = eval(command_obj)
+                command_obj = resolveReference(command_obj, self.figure)
                 reference_obj_str = reference_obj
-                reference_obj = eval(reference_obj)
+                reference_obj = resolveReference(reference_obj, self.figure)
 
                 # if values where saved during the pylustrator saved code
                 for change in getattr(reference_obj, "_pylustrator_old_values", []):
@@ -995,20 +1415,46 @@ class ChangeTracker:
                     )
                     continue
             # this error can occur if there are old saved lines that reference objects that are not there anymore
-            except (IndexError, ValueError):
+            except (IndexError, KeyError, ValueError):
                 continue
 
             self.get_reference_cached[reference_obj] = reference_obj_str
 
             # print("---", [reference_obj, reference_command], (command_obj, command + parameter))
-            self.changes[reference_obj, reference_command] = (
-                command_obj,
-                command + parameter,
+            self.setChange(
+                reference_obj, reference_command, command_obj, command + parameter
             )
         self.sorted_changes()
 
     def sorted_changes(self):
         """sort the changes by their priority. For example setting to logscale needs to be executed before xlim."""
+        self.updateRenderedChanges()
+        # iterate in the order of the changes, so that changes with the same priority keep their order
+        rendered = [
+            self.rendered_changes[key]
+            for key in self.changes
+            if key in self.rendered_changes
+        ]
+        rendered.sort(key=lambda entry: entry[0])
+        return [line for sort_key, line in rendered]
+
+    def getStructureSignature(self):
+        """a signature of the artists in the figure that the references of the changes depend on"""
+
+        def signature(figure):
+            return (
+                tuple(map(id, figure.axes)),
+                tuple(ax.get_label() for ax in figure.axes),
+                tuple(tuple(map(id, ax.get_children())) for ax in figure.axes),
+                tuple(map(id, figure.texts)),
+                tuple(map(id, figure.patches)),
+                tuple(signature(subfig) for subfig in getattr(figure, "subfigs", [])),
+            )
+
+        return getReference(self.figure), signature(self.figure)
+
+    def updateRenderedChanges(self):
+        """render the code lines of all changes that changed since the last call"""
 
         def getRef(obj):
             try:
@@ -1020,8 +1466,18 @@ class ChangeTracker:
                     return self.get_reference_cached[obj]
                 raise
 
-        indices = []
-        for reference_obj, reference_command in self.changes:
+        # if artists were added, removed or reordered, the references of all changes need to be rendered again
+        invalidateReferenceCache(self.figure)
+        signature = self.getStructureSignature()
+        if signature != self.rendered_signature:
+            self.rendered_signature = signature
+            self.rendered_changes = {}
+            self.dirty_changes = set(self.changes)
+
+        dirty_changes = set()
+        for reference_obj, reference_command in self.dirty_changes:
+            if (reference_obj, reference_command) not in self.changes:
+                continue
             try:
                 if isinstance(reference_obj, Figure):
                     obj_indices = ("", "", "", "")
@@ -1063,29 +1519,28 @@ class ChangeTracker:
                         )
                     else:
                         obj_indices = (getRef(reference_obj), "", "", reference_command)
-                indices.append(
-                    [
-                        (reference_obj, reference_command),
-                        self.changes[reference_obj, reference_command],
-                        obj_indices,
-                    ]
-                )
             except (ValueError, TypeError) as err:
                 print(err, file=sys.stderr)
+                dirty_changes.add((reference_obj, reference_command))
+                continue
 
-        srt = natsorted(indices, key=lambda a: a[2])
-        output = []
-        for s in srt:
-            command_obj, command = s[1]
+            command_obj, command = self.changes[reference_obj, reference_command]
             try:
-                output.append(getRef(command_obj) + command)
+                line = getRef(command_obj) + command
             except TypeError as err:
                 print(err, file=sys.stderr)
-
-        return output
+                dirty_changes.add((reference_obj, reference_command))
+                continue
+            self.rendered_changes[reference_obj, reference_command] = (
+                natsort_key(obj_indices),
+                line,
+            )
+        # changes that could not be rendered are tried again next time
+        self.dirty_changes = dirty_changes
 
     def save(self):
         """save the changes to the .py file"""
+        self.commitTransaction()
         global stack_position
         if stack_position is None:
             return
@@ -1137,7 +1592,6 @@ class ChangeTracker:
 def getTextFromFile(block_id: str, stack_pos: traceback.FrameSummary):
     """get the text which corresponds to the block_id (e.g. which figure) at the given position sepcified by stack_pos."""
     block_id = lineToId(block_id)
-    block = None
 
     if not custom_stack_position:
         if not stack_pos.filename.endswith(".py") and not stack_pos.filename.startswith(
@@ -1145,33 +1599,10 @@ def getTextFromFile(block_id: str, stack_pos: traceback.FrameSummary):
         ):
             return [], -1
 
-    start_lineno = -1
-
-    with open(stack_pos.filename, "r", encoding="utf-8") as fp1:
-        for lineno, line in enumerate(fp1, start=1):
-            # if we are currently reading a pylustrator block
-            if block is not None:
-                # add the line to the block
-                block.add(line)
-                # and see if we have found the end
-                if line.strip().startswith("#% end:") and line.strip().endswith(
-                        custom_append
-                ):
-                    block.end()
-            # if there is a new pylustrator block
-            elif line.strip().startswith(custom_prepend + "#% start:"):
-                block = Block(line)
-                start_lineno = lineno - 1
-
-            # if we are currently reading a block, continue with the next line
-            if block is not None and not block.finished:
-                continue
-
-            if block is not None and block.finished:
-                if block.id == block_id:
-                    return block, start_lineno
-            block = None
-    return [], start_lineno
+    block = getBlockIndex(stack_pos.filename).blocks_by_id.get(block_id)
+    if block is None:
+        return [], -1
+    return block, block.start_lineno
 
 
 class Block:
@@ -1180,11 +1611,13 @@ class Block:
     id = None
     finished = False
 
-    def __init__(self, line: str):
+    def __init__(self, line: str, start_lineno: int = -1):
         """initialize the block with its first line"""
         self.text = line
         self.size = 1
         self.indent = getIndent(line)
+        # the index of the first line of the block in the file
+        self.start_lineno = start_lineno
 
     def add(self, line: str):
         """add a line to the block"""
@@ -1202,6 +1635,60 @@ class Block:
         return iter(self.text.split("\n"))
 
 
+class BlockIndex:
+    """the lines of a source file and the positions of the pylustrator blocks in it"""
+
+    def __init__(self, lines: list[str]):
+        self.lines = lines
+        self.blocks: list[Block] = []
+        self.blocks_by_id: Dict[str, Block] = {}
+
+        block = None
+        for index, line in enumerate(lines):
+            # if we are currently reading a pylustrator block
+            if block is not None:
+                # add the line to the block
+                block.add(line)
+                # and see if we have found the end
+                if line.strip().startswith("#% end:") and line.strip().endswith(
+                        custom_append
+                ):
+                    block.end()
+                    self.blocks.append(block)
+                    # the first block with an id is the one that is used
+                    self.blocks_by_id.setdefault(block.id, block)
+                    block = None
+            # if there is a new pylustrator block
+            elif line.strip().startswith(custom_prepend + "#% start:"):
+                block = Block(line, index)
+
+
+# the block indices of the source files, together with the file state they were created for
+block_index_cache: Dict[str, Tuple[tuple, BlockIndex]] = {}
+
+
+def getFileState(filename: str) -> Optional[tuple]:
+    """the state of a file that invalidates its block index, or None if the file cannot be cached"""
+    if isJupyterCell(filename):
+        return None
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size, custom_prepend, custom_append
+
+
+def getBlockIndex(filename: str) -> BlockIndex:
+    """get the block index of a file, it is only read again if the file changed"""
+    state = getFileState(filename)
+    cached = block_index_cache.get(filename)
+    if state is not None and cached is not None and cached[0] == state:
+        return cached[1]
+
+    with open(filename, "r", encoding="utf-8") as fp:
+        block_index = BlockIndex(list(fp))
+    if state is not None:
+        block_index_cache[filename] = (state, block_index)
+    return block_index
+
+
 def getIndent(line: str):
     """get the indent part of a line of code"""
     i = 0
@@ -1212,16 +1699,6 @@ def getIndent(line: str):
     return indent
 
 
-class LineNumberFilePointer:
-    def __init__(self, fp: IO):
-        self.fp = fp
-        self.lineno = 0
-
-    def write(self, line: str):
-        self.fp.write(line)
-        self.lineno += line.count("\n")
-
-
 def lineToId(line: str):
     """get the id of a line, e.g. part which specifies which figure it refers to"""
     line = line.strip()
@@ -1236,76 +1713,57 @@ def insertTextToFile(
 ):
     """insert a text block into a file"""
     figure_id_line = lineToId(figure_id_line)
-    block = None
+    block_index = getBlockIndex(stack_pos.filename)
+    lines = block_index.lines
     written = False
     written_end = False
     lineno_stack = None
-    # open a temporary file with the same name for writing
-    with open(stack_pos.filename + ".tmp", "w", encoding="utf-8") as fp2:
-        fp2 = LineNumberFilePointer(fp2)
-        # open the current python file for reading
-        with open(stack_pos.filename, "r", encoding="utf-8") as fp1:
-            # iterate over all lines and line numbers
-            for fp1.lineno, line in enumerate(fp1, start=1):
-                # if we are currently reading a pylustrator block
-                if block is not None:
-                    # add the line to the block
-                    block.add(line)
-                    # and see if we have found the end
-                    if line.strip().startswith("#% end:") and line.strip().endswith(
-                            custom_append
-                    ):
-                        block.end()
-                        line = ""
-                # if there is a new pylustrator block
-                elif line.strip().startswith(custom_prepend + "#% start:"):
-                    block = Block(line)
-
-                # if we are currently reading a block, continue with the next line
-                if block is not None and not block.finished:
-                    continue
-
-                # the current block is finished
-                if block is not None:
-                    # either it is the block we want to save, then replace the old block with the new
-                    if block.id == figure_id_line:
-                        # remember that we wrote the new block
-                        written = fp2.lineno + 1
-                        # write the new block to the target file instead of the current block
-                        indent = block.indent
-                        for line_text in new_block:
-                            fp2.write(indent + line_text + "\n")
-                        written_end = fp2.lineno
-                    # or it is another block, then we just write it
-                    else:
-                        # the we just copy the current block into the new file
-                        fp2.write(block.text)
-                    # we already handled this block
-                    block = None
-
-                # if we are at the entry point (e.g. plt.show())
-                if fp1.lineno == stack_pos.lineno:
-                    # and if we not have written the new block
-                    if not written:
-                        written = fp2.lineno + 1
-                        # we write it now to the target file
-                        indent = getIndent(line)
-                        for line_text in new_block:
-                            fp2.write(indent + line_text + "\n")
-                        written_end = fp2.lineno
-                    # and we store the position where we will write the entry point (e.g. the plt.show())
-                    lineno_stack = fp2.lineno + 1
-                # transfer the current line to the new file
-                fp2.write(line)
+    # the index of the line of the entry point (e.g. plt.show())
+    stack_index = stack_pos.lineno - 1 if stack_pos.lineno is not None else -1
+
+    # compose the new file content in memory
+    output: list[str] = []
+
+    def write_new_block(indent: str):
+        start = len(output) + 1
+        output.extend(indent + line_text + "\n" for line_text in new_block)
+        return start, len(output)
+
+    # copy the lines between the blocks and replace the block with the given id
+    position = 0
+    for block in block_index.blocks + [None]:
+        gap_end = block.start_lineno if block is not None else len(lines)
+        # if the entry point is before the current block
+        if position <= stack_index < gap_end:
+            output.extend(lines[position:stack_index])
+            # and if we not have written the new block, we write it now
+            if not written:
+                written, written_end = write_new_block(getIndent(lines[stack_index]))
+            # and we store the position where we will write the entry point
+            lineno_stack = len(output) + 1
+            position = stack_index
+        output.extend(lines[position:gap_end])
+        if block is None:
+            break
+        # either it is the block we want to save, then replace the old block with the new
+        if block.id == figure_id_line:
+            written, written_end = write_new_block(block.indent)
+        # or it is another block, then we just copy it
+        else:
+            output.extend(lines[block.start_lineno:block.start_lineno + block.size])
+        position = block.start_lineno + block.size
 
     # update the position of the entry point, as we have inserted stuff in the new file which can change the position
     stack_pos.lineno = lineno_stack
 
-    # now copy the temporary file over the old file
-    with open(stack_pos.filename + ".tmp", "r", encoding="utf-8") as fp2:
-        with open(stack_pos.filename, "w", encoding="utf-8") as fp1:
-            for line in fp2:
-                fp1.write(line)
+    # replace the old file with the new content
+    text = "".join(output)
+    writeFileAtomic(stack_pos.filename, text)
+    # the new content is already known, no need to read it again
+    state = getFileState(stack_pos.filename)
+    if state is not None:
+        block_index = BlockIndex(list(io.StringIO(text)))
+        block_index_cache[stack_pos.filename] = (state, block_index)
     print(
         "save",
         figure_id_line,
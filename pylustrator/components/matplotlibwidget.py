@@ -34,16 +34,20 @@ Copyright © 2005 Florent Rougon, 2006 Darren Dale
 
 __version__ = "1.0.0"
 
+import copy
 import time
+from contextlib import contextmanager, nullcontext
 from typing import TYPE_CHECKING
 
+import numpy as np
+
 import qtawesome as qta
 
 if TYPE_CHECKING:
-    from PyQt5 import QtWidgets, QtCore
+    from PyQt5 import QtWidgets, QtCore, QtGui
     from PyQt5.QtCore import pyqtSignal as Signal
 else:
-    from qtpy import QtWidgets, QtCore
+    from qtpy import QtWidgets, QtCore, QtGui
     from qtpy.QtCore import Signal
 
 try:  # for matplotlib > 3.0
@@ -58,14 +62,142 @@ except ModuleNotFoundError:
         FigureManager,  # ty:ignore[unresolved-import]
         NavigationToolbar2QT as NavigationToolbar,
     )
-from matplotlib.figure import Figure
+from matplotlib.artist import Artist
+from matplotlib.axes import Axes
+from matplotlib.backend_bases import DrawEvent
+from matplotlib.collections import PathCollection
+from matplotlib.figure import Figure, SubFigure
+from matplotlib.image import AxesImage
+from matplotlib.lines import Line2D
+
+
+def decimate_line(line: Line2D, cell: float):
+    """the indices of the points that keep the first, last, min and max point per column"""
+    if line.get_marker() not in (None, "None", "", " "):
+        return None
+    if line.get_drawstyle() != "default":
+        return None
+    points = line.get_transform().transform(line.get_xydata())
+    if not np.all(np.isfinite(points)):
+        return None
+    columns = np.floor(points[:, 0] / cell)
+    # only lines that run from left to right can be reduced per column
+    if np.any(np.diff(columns) < 0):
+        return None
+    starts = np.flatnonzero(np.diff(columns)) + 1
+    column_index = np.zeros(len(columns), dtype=int)
+    column_index[starts] = 1
+    column_index = np.cumsum(column_index)
+    # sort by column and then by the y value to get the min and max of each column
+    order = np.lexsort((points[:, 1], column_index))
+    return np.unique(
+        np.concatenate(
+            [
+                np.r_[0, starts],
+                np.r_[starts - 1, len(columns) - 1],
+                order[np.r_[0, starts]],
+                order[np.r_[starts - 1, len(columns) - 1]],
+            ]
+        )
+    )
+
+
+def decimate_collection(collection: PathCollection, cell: float):
+    """the indices of the points to keep to draw only the topmost point per cell"""
+    offsets = collection.get_offsets()
+    count = len(offsets)
+    if len(collection.get_paths()) > 1:
+        return None
+    # edges that have their own colors and do not follow the faces are not supported
+    edgecolors = collection.get_edgecolor()
+    if len(edgecolors) == count and edgecolors is not collection.get_facecolor():
+        return None
+    points = collection.get_offset_transform().transform(offsets)
+    if not np.all(np.isfinite(points)):
+        return None
+    cells = np.floor(points / cell).astype(np.int64)
+    cells -= cells.min(axis=0)
+    keys = cells[:, 0] * (cells[:, 1].max() + 1) + cells[:, 1]
+    # the last point of a cell is drawn on top
+    _, last = np.unique(keys[::-1], return_index=True)
+    return np.sort(count - 1 - last)
+
+
+def draw_instead(artist: Artist, proxy: Artist, restore: list):
+    """let the figure draw the proxy instead of the artist, the artist itself is not changed"""
+    previous = artist.__dict__.get("draw")
+    artist.draw = proxy.draw
+
+    def restore_draw():
+        if previous is None:
+            del artist.draw
+        else:
+            artist.draw = previous
+
+    restore.append(restore_draw)
+
+
+@contextmanager
+def reduced_detail(artists: list, max_points: int = 5000, cell: float = 1):
+    """draw lines and collections with many points decimated and large images with
+    nearest interpolation, using copies so that the artists and their stale state stay
+    untouched"""
+    restore = []
+    for artist in artists:
+        for line in artist.findobj(Line2D):
+            if len(line.get_xdata(orig=False)) <= max_points:
+                continue
+            index = decimate_line(line, cell)
+            if index is None:
+                continue
+            # a copy does not propagate its stale state to the axes
+            proxy = copy.copy(line)
+            proxy.set_data(
+                line.get_xdata(orig=False)[index], line.get_ydata(orig=False)[index]
+            )
+            draw_instead(line, proxy, restore)
+
+        for collection in artist.findobj(PathCollection):
+            count = len(collection.get_offsets())
+            if count <= max_points:
+                continue
+            index = decimate_collection(collection, 2 * cell)
+            if index is None:
+                continue
+            proxy = copy.copy(collection)
+            proxy.set_offsets(collection.get_offsets()[index])
+            sizes = collection.get_sizes()
+            if len(sizes) == count:
+                proxy.set_sizes(sizes[index])
+            linewidths = collection.get_linewidth()
+            if len(linewidths) == count:
+                proxy.set_linewidth(linewidths[index])
+            array = collection.get_array()
+            facecolors = collection.get_facecolor()
+            if array is not None and len(array) == count:
+                proxy.set_array(array[index])
+            elif len(facecolors) == count:
+                proxy.set_facecolor(facecolors[index])
+            draw_instead(collection, proxy, restore)
+
+        for image in artist.findobj(AxesImage):
+            if image.get_array() is None or image.get_array().size <= max_points:
+                continue
+            # resampling with the nearest pixel is faster than antialiasing
+            proxy = copy.copy(image)
+            proxy.set_interpolation("nearest")
+            draw_instead(image, proxy, restore)
+    try:
+        yield
+    finally:
+        for function in restore[::-1]:
+            function()
 
 
 class MatplotlibWidget(FigureCanvas):
-    quick_draw = True
     window_pylustrator = None  # "PlotLayout" | None = None
 
-    def __init__(self, parent=None, figure=None, *args, **kwargs):
+    def __init__(self, parent=None, figure=None, *args, render_cache=False, **kwargs):
         if figure is None:
             self.figure = Figure(*args, **kwargs)
         else:
@@ -73,6 +205,7 @@ class MatplotlibWidget(FigureCanvas):
 
         super().__init__(self.figure)
         self.setParent(parent)
+        self.render_cache = render_cache
 
         self.setSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
         self.updateGeometry()
@@ -81,36 +214,280 @@ class MatplotlibWidget(FigureCanvas):
         self.manager._cidgcf = self.figure
 
         self.timer = QtCore.QTimer()
-        self.timer.setInterval(300)
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.draw)
 
+        self.frame_timer = QtCore.QTimer()
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(self.frame_interval)
+        self.frame_timer.timeout.connect(self.process_frame)
+
     timer: QtCore.QTimer | None = None
+    # the time in s a draw may take, slower figures are drawn less often to stay responsive
+    frame_budget = 1 / 30
+    # the longest delay in s between a draw request and the draw
+    max_draw_delay = 0.3
+    # the moving average of the duration of a draw in s and the time when the last draw ended
+    draw_duration = 0.0
+    last_draw_end = 0.0
+    # the number of draw requests that were merged into another draw
+    saved_draws = 0
+    # True while the figure is drawn
+    drawing = False
+    # only render the axes that changed since the last draw and keep the others (opt-in, see pylustrator.start)
+    render_cache = False
+    # the key of the renderer, the empty figure and the state and extent of every axes
+    render_cache_state: tuple | None = None
+    # the interval in ms in which coalesced events (e.g. mouse motions) are processed
+    frame_interval = 16
+    frame_timer: QtCore.QTimer | None = None
+    frame_callback = None
+    # draw artists with many points with less detail while the user drags or zooms
+    level_of_detail = True
+    # artists with more points or image pixels are drawn with less detail
+    lod_max_points = 5000
+    interacting = False
+
+    def begin_interaction(self):
+        """draw with less detail until end_interaction is called"""
+        self.interacting = True
+
+    def end_interaction(self):
+        """draw in full quality again"""
+        if self.interacting:
+            self.interacting = False
+            # the image of the render cache was drawn with less detail
+            self.render_cache_state = None
+            self.schedule_draw()
+
+    def reduced_detail(self, artists: list | None = None):
+        """the context to draw the artists (default the figure) while interacting"""
+        if not (self.interacting and self.level_of_detail):
+            return nullcontext()
+        if artists is None:
+            artists = [self.figure]
+        return reduced_detail(artists, self.lod_max_points)
+
+    def schedule_frame(self, callback):
+        """call the callback at the next frame, a later callback replaces an earlier one"""
+        self.frame_callback = callback
+        if self.frame_timer is None:
+            return self.process_frame()
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
+
+    def process_frame(self):
+        """call the callback that was scheduled for the frame"""
+        if self.frame_timer:
+            self.frame_timer.stop()
+        callback, self.frame_callback = self.frame_callback, None
+        if callback is not None:
+            callback()
 
     def schedule_draw(self):
-        if self.quick_draw is True:
-            return super().draw()
-        if self.timer and not self.timer.isActive():
-            self.timer.start()
+        """request a draw, all requests until the draw happens are merged into one draw"""
+        if self.timer is None:
+            return self.draw()
+        if self.timer.isActive():
+            self.saved_draws += 1
+            return
+        # fast figures are drawn in the next iteration of the event loop
+        delay = 0.0
+        # slow figures leave time for the user input between two draws
+        if self.draw_duration > self.frame_budget:
+            delay = min(self.draw_duration, self.max_draw_delay)
+        wait = max(0.0, self.last_draw_end + delay - time.time())
+        self.timer.start(int(wait * 1000))
+
+    def draw_idle(self):
+        """request a draw, matplotlib and pylustrator requests are merged by schedule_draw"""
+        if self.timer is None:
+            return super().draw_idle()
+        # the stale callbacks of artists updated by the draw itself do not need a draw
+        if self.drawing or getattr(self, "_is_drawing", False):
+            return
+        self.schedule_draw()
 
     def draw(self):
         if self.timer:
+            # a pending draw request is served by this draw
+            if self.timer.isActive():
+                self.saved_draws += 1
             self.timer.stop()
         # import traceback
         # print(traceback.print_stack())
         t = time.time()
-        super().draw()
-        duration = time.time() - t
-        # if drawing is slow delay the drawing a bit to create a more smooth experience
-        if duration > 0.1:
-            self.quick_draw = False
+        self.drawing = True
+        try:
+            with self.reduced_detail():
+                if not (self.render_cache and self.draw_changed_axes()):
+                    super().draw()
+                    if self.render_cache:
+                        self.store_render_cache()
+        finally:
+            self.drawing = False
+        self.last_draw_end = time.time()
+        duration = self.last_draw_end - t
+        # the moving average of the draw duration
+        if self.draw_duration == 0:
+            self.draw_duration = duration
         else:
-            self.quick_draw = True
+            self.draw_duration = 0.7 * self.draw_duration + 0.3 * duration
+
+    def get_render_cache_key(self):
+        """the properties that require a new image of the empty figure"""
+        patch = self.figure.patch
+        return (
+            self._lastKey,
+            tuple(patch.get_facecolor()),
+            tuple(patch.get_edgecolor()),
+            patch.get_linewidth(),
+            patch.get_visible(),
+        )
+
+    @staticmethod
+    def get_axes_state(axes: Axes):
+        """the properties of an axes that require to render it again"""
+        return (
+            axes.bbox.bounds,
+            axes.get_xlim(),
+            axes.get_ylim(),
+            axes.get_visible(),
+            axes.get_zorder(),
+        )
+
+    @staticmethod
+    def get_axes_extent(axes: Axes, renderer):
+        """the region in pixels that the axes and its artists cover"""
+        extent = axes.get_tightbbox(renderer) if axes.get_visible() else None
+        if extent is None:
+            extent = axes.bbox
+        # updating the ticks for the extent marks the axes as stale again
+        axes.stale = False
+        # include the antialiasing at the border
+        return extent.padded(2).frozen()
+
+    def store_render_cache(self):
+        """store the empty figure and the extents of the axes after a full draw"""
+        figure = self.figure
+        renderer = self.get_renderer()
+        key = self.get_render_cache_key()
+        if self.render_cache_state is not None and self.render_cache_state[0] == key:
+            background = self.render_cache_state[1]
+        else:
+            # draw only the figure patch to clear the regions of changed axes later
+            image = self.copy_from_bbox(figure.bbox)
+            renderer.clear()
+            figure.patch.draw(renderer)
+            background = self.copy_from_bbox(figure.bbox)
+            self.restore_region(image)
+        axes_states = {
+            axes: (self.get_axes_state(axes), self.get_axes_extent(axes, renderer))
+            for axes in figure.axes
+        }
+        self.render_cache_state = (key, background, axes_states)
+
+    def draw_changed_axes(self) -> bool:
+        """draw only the changed axes on the last image, False if a full draw is needed"""
+        figure = self.figure
+        if self.render_cache_state is None or not hasattr(self, "renderer"):
+            return False
+        if figure.get_layout_engine() is not None:
+            return False
+        renderer = self.get_renderer()
+        key, background, axes_states = self.render_cache_state
+        if key != self.get_render_cache_key() or list(axes_states) != figure.axes:
+            return False
+        # changes outside the axes need a full draw
+        others = []
+        for child in figure.get_children():
+            if isinstance(child, Axes) or child is figure.patch:
+                continue
+            if child.stale or isinstance(child, SubFigure):
+                return False
+            if child.get_visible():
+                others.append(child.get_window_extent(renderer))
+
+        changed = {}
+        regions = []
+        for axes in figure.axes:
+            state, extent = axes_states[axes]
+            if axes.stale or state != self.get_axes_state(axes):
+                changed[axes] = self.get_axes_extent(axes, renderer)
+                regions.append(extent)
+                regions.append(changed[axes])
+            else:
+                others.append(extent)
+        # the regions that are drawn again may not cover unchanged artists
+        if any(region.overlaps(other) for region in regions for other in others):
+            return False
+
+        # clear the old and new regions of the changed axes
+        height = figure.bbox.height
+        for region in regions:
+            x0, y0, x1, y1 = region.extents
+            self.restore_region(
+                background,
+                bbox=(max(x0, 0), max(height - y1, 0), x1, height - y0),
+                xy=(0, 0),
+            )
+        for axes in sorted(changed, key=lambda axes: axes.get_zorder()):
+            if not axes.get_animated():
+                axes.draw(renderer)
+            axes_states[axes] = (self.get_axes_state(axes), changed[axes])
+        figure.stale = False
+        DrawEvent("draw_event", self, renderer)._process()
+        self.update()
+        return True
 
     def show(self):
         self.draw()
 
+    # the dpi at which the last image is shown scaled until the figure is drawn again
+    preview_dpi: float | None = None
+    preview_image: QtGui.QImage | None = None
+
+    def show_preview(self, dpi: float):
+        """show the last image scaled to the dpi without drawing the figure"""
+        if self.preview_image is None:
+            if not hasattr(self, "renderer"):
+                self.draw()
+            image = np.asarray(self.buffer_rgba())
+            h, w = image.shape[:2]
+            self.preview_image = QtGui.QImage(
+                image.tobytes(), w, h, QtGui.QImage.Format.Format_RGBA8888
+            ).copy()
+        self.preview_dpi = dpi
+        self.updateGeometry()
+        self.update()
+
+    def end_preview(self):
+        """show the drawn figure again"""
+        self.preview_dpi = None
+        self.preview_image = None
+        self.updateGeometry()
+
+    def paintEvent(self, event):
+        if self.preview_image is None:
+            return super().paintEvent(event)
+        painter = QtGui.QPainter(self)
+        try:
+            painter.setRenderHint(QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+            painter.drawImage(QtCore.QRectF(self.rect()), self.preview_image)
+        finally:
+            painter.end()
+
+    def resizeEvent(self, event):
+        # the size of the preview does not change the size of the figure
+        if self.preview_image is not None:
+            return
+        super().resizeEvent(event)
+
     def sizeHint(self):
         w, h = self.get_width_height()
+        if self.preview_dpi is not None:
+            scale = self.preview_dpi / self.figure.dpi
+            return QtCore.QSize(int(w * scale), int(h * scale))
         return QtCore.QSize(w, h)
 
     def minimumSizeHint(self):
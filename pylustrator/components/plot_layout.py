@@ -99,6 +99,8 @@ class Canvas(QtWidgets.QWidget):
     fitted_to_view = False
     footer_label = None
     footer_label2 = None
+    # the time in ms after the last zoom step until the figure is drawn at the new dpi
+    zoom_delay = 200
 
     canvas: MatplotlibWidget | None = None
 
@@ -154,6 +156,10 @@ class Canvas(QtWidgets.QWidget):
         )
         self.selections_view.canvas_canvas = self.canvas_canvas
 
+        self.zoom_timer = QtCore.QTimer()
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.timeout.connect(self.applyZoom)
+
     def setFigure(self, figure):
         if self.canvas is not None:
             self.canvas_wrapper_layout.removeWidget(self.canvas)
@@ -195,10 +201,8 @@ class Canvas(QtWidgets.QWidget):
         if self.canvas is None:
             return
         """update the ruler around the figure to show the dimensions"""
-        trans = (
-            transforms.Affine2D().scale(1.0 / 2.54, 1.0 / 2.54)
-            + self.fig.dpi_scale_trans
-        )
+        # the dpi of the zoom preview while it is shown
+        trans = transforms.Affine2D().scale(1.0 / 2.54, 1.0 / 2.54).scale(self.getDpi())
         l0 = 20
         l1 = 20
         l2 = 10
@@ -323,7 +327,8 @@ class Canvas(QtWidgets.QWidget):
         self.y_scale.setMinimumSize(l0, h)
         self.y_scale.setMaximumSize(l0, h)
 
-        w, h = self.canvas.get_width_height()
+        size = self.canvas.sizeHint()
+        w, h = size.width(), size.height()
 
         self.pixmap = QtGui.QPixmap(w, h)
 
@@ -345,24 +350,33 @@ class Canvas(QtWidgets.QWidget):
         self.canvas_border.setMinimumSize(w + 2, h + 2)
         self.canvas_border.setMaximumSize(w + 2, h + 2)
 
-    def fitToView(self, change_dpi: bool = False):
-        """fit the figure to the view"""
+    def fitToView(self, change_dpi: bool = False, preview: bool = False):
+        """fit the figure to the view, with preview the dpi is only applied when the resizing stops"""
         if self.canvas is None:
             return
         self.fitted_to_view = True
         if change_dpi:
-            w, h = self.canvas.get_width_height()
+            # the shown size, which can be a scaled preview
+            size = self.canvas.sizeHint()
             factor = min(
-                (self.canvas_canvas.width() - 30) / w,
-                (self.canvas_canvas.height() - 30) / h,
+                (self.canvas_canvas.width() - 30) / size.width(),
+                (self.canvas_canvas.height() - 30) / size.height(),
             )
-            self.fig.set_dpi(self.fig.get_dpi() * factor)
-            # self.fig.canvas.draw()
+            dpi = self.getDpi() * factor
+            if preview:
+                self.previewZoom(dpi)
+                size = self.canvas.sizeHint()
+                w, h = size.width(), size.height()
+            else:
+                self.zoom_timer.stop()
+                self.canvas.end_preview()
+                self.fig.set_dpi(dpi)
+                # self.fig.canvas.draw()
 
-            self.canvas.updateGeometry()
-            w, h = self.canvas.get_width_height()
-            self.canvas_container.setMinimumSize(w, h)
-            self.canvas_container.setMaximumSize(w, h)
+                self.canvas.updateGeometry()
+                w, h = self.canvas.get_width_height()
+                self.canvas_container.setMinimumSize(w, h)
+                self.canvas_container.setMaximumSize(w, h)
 
             self.canvas_container.move(
                 int((self.canvas_canvas.width() - w) / 2 + 10),
@@ -400,42 +414,59 @@ class Canvas(QtWidgets.QWidget):
 
         self.updateRuler()
 
+    def getDpi(self) -> float:
+        """the dpi at which the figure is shown"""
+        if self.canvas is not None and self.canvas.preview_dpi is not None:
+            return self.canvas.preview_dpi
+        return self.fig.get_dpi()
+
+    def previewZoom(self, dpi: float):
+        """show the last image scaled to the dpi and draw the figure when the zooming stops"""
+        self.canvas.show_preview(dpi)
+        size = self.canvas.sizeHint()
+        self.canvas_container.setMinimumSize(size)
+        self.canvas_container.setMaximumSize(size)
+        self.zoom_timer.start(self.zoom_delay)
+
+    def applyZoom(self):
+        """draw the figure at the dpi of the zoom preview"""
+        self.zoom_timer.stop()
+        if self.canvas is None or self.canvas.preview_dpi is None:
+            return
+        dpi = self.canvas.preview_dpi
+        self.canvas.end_preview()
+        self.fig.set_dpi(dpi)
+
+        self.canvas.updateGeometry()
+        w, h = self.canvas.get_width_height()
+        self.canvas_container.setMinimumSize(w, h)
+        self.canvas_container.setMaximumSize(w, h)
+        self.fig.canvas.draw()
+        self.updateRuler()
+
     def scroll_event(self, event: MouseEvent):
         """when the mouse wheel is used to zoom the figure"""
         if self.canvas is None:
             return
         if self.control_modifier:
-            new_dpi = self.fig.get_dpi() + 10 * event.step
+            dpi = self.getDpi()
+            new_dpi = dpi + 10 * event.step
             # prevent zoom to be too far out
-            if new_dpi < 0:
+            if new_dpi <= 0:
                 return
 
             self.fig.figure_dragger.select_element(None)
 
-            pos = self.fig.transFigure.inverted().transform((event.x, event.y))
-            pos_ax = self.fig.transFigure.transform(self.fig.axes[0].get_position())[0]
-
-            self.fig.set_dpi(new_dpi)
-            self.fig.canvas.draw()
-
-            self.canvas.updateGeometry()
-            w, h = self.canvas.get_width_height()
-            self.canvas_container.setMinimumSize(w, h)
-            self.canvas_container.setMaximumSize(w, h)
-
-            pos2 = self.fig.transFigure.transform(pos)
-            diff = np.array([event.x, event.y]) - pos2
-
-            pos_ax2 = self.fig.transFigure.transform(self.fig.axes[0].get_position())[0]
-            diff += pos_ax2 - pos_ax
-            self.moveCanvasCanvas(*diff)
-
-            # bb = self.fig.axes[0].get_position()
+            # keep the point of the figure below the mouse at its position
+            mouse = self.canvas.mapFromGlobal(QtGui.QCursor.pos())
+            factor = new_dpi / dpi
+            self.previewZoom(new_dpi)
+            self.moveCanvasCanvas(mouse.x() * (1 - factor), mouse.y() * (1 - factor))
 
     def resizeEvent(self, event: QtCore.QEvent):
         """when the window is resized"""
         if self.fitted_to_view:
-            self.fitToView(True)
+            self.fitToView(True, preview=True)
         else:
             self.updateRuler()
 
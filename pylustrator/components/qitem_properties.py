@@ -1211,15 +1211,9 @@ class QTickEdit(QtWidgets.QWidget):
                 getattr(element, "set_" + self.axis + "lim")(lim)
                 if isinstance(locator, AutoLocator):
                     # make sure there are no old changes to this element
-                    keys = [k for k in fig.change_tracker.changes]
-                    for reference_obj, reference_command in keys:
-                        if (
-                                reference_obj == element
-                                and reference_command == ".set_" + self.axis + "ticks"
-                        ):
-                            del fig.change_tracker.changes[
-                                reference_obj, reference_command
-                            ]
+                    fig.change_tracker.removeChange(
+                        element, ".set_" + self.axis + "ticks"
+                    )
                 else:
                     self.fig.change_tracker.addChange(
                         element,
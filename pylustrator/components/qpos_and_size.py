@@ -154,7 +154,10 @@ class QPosAndSize(QtWidgets.QWidget):
                     )
 
         redo()
-        self.fig.change_tracker.addEdit([undo, redo, "Change position"])
+        self.fig.change_tracker.addEdit(
+            [undo, redo, "Change position"],
+            merge_key=(tuple(elements), "Change position"),
+        )
 
         self.fig.signals.figure_selection_property_changed.emit()
         self.fig.canvas.draw()
@@ -245,7 +248,9 @@ class QPosAndSize(QtWidgets.QWidget):
                         )
 
             redo()
-            self.fig.change_tracker.addEdit([undo, redo, "Change size"])
+            self.fig.change_tracker.addEdit(
+                [undo, redo, "Change size"], merge_key=(tuple(elements), "Change size")
+            )
             self.fig.signals.figure_selection_property_changed.emit()
             self.fig.canvas.draw()
 
@@ -19,12 +19,18 @@
 # You should have received a copy of the GNU General Public License
 # along with Pylustrator. If not, see <http://www.gnu.org/licenses/>
 
+from contextlib import nullcontext
+from weakref import WeakSet
+
 import numpy as np
 from matplotlib.artist import Artist
 from matplotlib.figure import Figure, SubFigure
 from matplotlib.axes import Axes
+from matplotlib.axis import Axis
+from matplotlib.legend import Legend
 from matplotlib.text import Text
-from matplotlib.patches import Rectangle
+from matplotlib.patches import Patch, Rectangle
+from matplotlib.spines import Spine
 from matplotlib.backend_bases import MouseEvent, KeyEvent, Event
 from typing import TYPE_CHECKING, Sequence, Callable, Tuple, List, Any, cast, Type
 
@@ -34,7 +40,17 @@ if TYPE_CHECKING:
 else:
     from qtpy import QtCore, QtGui, QtWidgets
 
-from .snap import TargetWrapper, getSnaps, checkSnaps, checkSnapsActive, SnapBase
+from .snap import (
+    TargetWrapper,
+    checkXLabel,
+    checkYLabel,
+    getSnaps,
+    checkSnaps,
+    checkSnapsActive,
+    SnapBase,
+    SnapEngine,
+    getSpatialIndex,
+)
 from .change_tracker import ChangeTracker
 from pylustrator.change_tracker import UndoRedo
 import time
@@ -44,7 +60,18 @@ DIR_Y0 = 2
 DIR_X1 = 4
 DIR_Y1 = 8
 
-blit = False
+# redraw only the moved artists on top of a cached background while dragging
+blit = True
+
+
+def get_blit_artist(target: Artist) -> Artist:
+    """get the artist that has to be redrawn when the target moves"""
+    # axis labels are drawn by their axis and not by the axes
+    if checkXLabel(target):
+        return checkXLabel(target).xaxis
+    if checkYLabel(target):
+        return checkYLabel(target).yaxis
+    return target
 
 
 class GrabFunctions(object):
@@ -54,9 +81,15 @@ class GrabFunctions(object):
     target = None
     dir: int
     snaps: list[SnapBase]
+    snap_engine: SnapEngine
     targets: list[TargetWrapper]
 
     got_artist = False
+    # the latest motion event that was not processed yet
+    pending_motion: MouseEvent | None = None
+    # the artists that are drawn animated and the background of the current drag
+    blit_artists: list[Artist] = []
+    blit_background = None
 
     def __init__(self, parent, dir: int, no_height=False):
         figure: Figure = parent.figure
@@ -66,6 +99,7 @@ class GrabFunctions(object):
         self.parent = parent
         self.dir = dir
         self.snaps = []
+        self.snap_engine = SnapEngine([])
         self.no_height = no_height
 
     def on_motion(self, evt: Event):
@@ -73,8 +107,22 @@ class GrabFunctions(object):
         if not isinstance(evt, MouseEvent):
             raise TypeError()
         if self.got_artist:
-            self.movedEvent(evt)
-            self.moved = True
+            # only the latest motion of a frame is processed
+            self.pending_motion = evt
+            schedule_frame = getattr(self.figure.canvas, "schedule_frame", None)
+            if schedule_frame is None:
+                self.process_motion()
+            else:
+                schedule_frame(self.process_motion)
+
+    def process_motion(self):
+        """move the object to the latest motion event"""
+        evt = self.pending_motion
+        self.pending_motion = None
+        if evt is None or not self.got_artist:
+            return
+        self.movedEvent(evt)
+        self.moved = True
 
     def button_press_event(self, evt: MouseEvent):
         """when the mouse is pressed"""
@@ -87,6 +135,8 @@ class GrabFunctions(object):
     def button_release_event(self, event: MouseEvent):
         """when the mouse is released"""
         if self.got_artist:
+            # apply the last motion before the drag ends
+            self.process_motion()
             self.got_artist = False
             self.figure.canvas.mpl_disconnect(self._c1)
             self.releasedEvent(event)
@@ -96,35 +146,48 @@ class GrabFunctions(object):
         self.parent.start_move()
         self.mouse_xy = (event.x, event.y)
 
-        for s in self.snaps:
-            s.remove()
-        self.snaps = []
-
+        self.snap_engine.remove()
         self.snaps = getSnaps(self.targets, self.dir, no_height=self.no_height)
-
-        if blit is True:
-            for target in self.targets:
-                target.target.set_animated(True)
-
-            self.figure.canvas.draw()
-            self.bg = self.figure.canvas.copy_from_bbox(self.figure.bbox)
-        else:
-            pass
+        # pack the positions of the snap targets for the whole drag
+        self.snap_engine = SnapEngine(self.snaps)
         self.time = time.time()
 
     def releasedEvent(self, event: MouseEvent):
         """when the mouse is released"""
-        for snap in self.snaps:
-            snap.remove()
+        self.snap_engine.remove()
         self.snaps = []
 
         self.parent.end_move()
+        end_interaction = getattr(self.figure.canvas, "end_interaction", None)
+        if end_interaction is not None:
+            end_interaction()
+
+        # draw the moved artists again in the figure with the correct order
+        if self.parent.blit_background is not None:
+            self.stop_blit()
+            self.figure.canvas.draw_idle()
+
+    def start_blit(self):
+        """draw the figure without the targets and cache it as background for the drag"""
+        selection = self.parent
+        selection.blit_artists = [
+            get_blit_artist(target.target) for target in self.targets
+        ]
+        for artist in selection.blit_artists:
+            artist.set_animated(True)
+            # the render cache of the canvas has to draw the region again
+            artist.stale = True
+        self.figure.canvas.draw()
+        selection.blit_background = self.figure.canvas.copy_from_bbox(self.figure.bbox)
 
-        if blit is True:
-            for target in self.targets:
-                target.target.set_animated(False)
-        else:
-            pass
+    def stop_blit(self):
+        """draw the targets normally again and drop the cached background"""
+        selection = self.parent
+        for artist in selection.blit_artists:
+            artist.set_animated(False)
+            artist.stale = True
+        selection.blit_artists = []
+        selection.blit_background = None
 
     def movedEvent(self, event: MouseEvent):
         """when the mouse is moved"""
@@ -134,6 +197,16 @@ class GrabFunctions(object):
         dx = event.x - self.mouse_xy[0]
         dy = event.y - self.mouse_xy[1]
 
+        canvas = self.figure.canvas
+        use_blit = blit is True and getattr(canvas, "supports_blit", False)
+        # cache the background at the first move, a click alone does not need it
+        if use_blit and self.parent.blit_background is None:
+            self.start_blit()
+        # the artists are drawn with less detail until the mouse is released
+        begin_interaction = getattr(canvas, "begin_interaction", None)
+        if begin_interaction is not None:
+            begin_interaction()
+
         keep_aspect = (
             "control" in event.key.split("+") if event.key is not None else False
         )
@@ -144,20 +217,23 @@ class GrabFunctions(object):
         self.parent.move(
             [dx, dy],
             self.dir,
-            self.snaps,
+            self.snap_engine,
             keep_aspect_ratio=keep_aspect,
             ignore_snaps=ignore_snaps,
         )
 
-        if blit is True:
+        if use_blit:
             fig = self.figure
-            fig.canvas.restore_region(self.bg)
-            for target in self.targets:
-                fig.draw_artist(target.target)
-            # copy the image to the GUI state, but screen might not be changed yet
+            fig.canvas.restore_region(self.parent.blit_background)
+            reduced_detail = getattr(fig.canvas, "reduced_detail", None)
+            context = nullcontext()
+            if reduced_detail is not None:
+                context = reduced_detail(self.parent.blit_artists)
+            with context:
+                for artist in self.parent.blit_artists:
+                    fig.draw_artist(artist)
+            # copy the image to the GUI state
             fig.canvas.blit(fig.bbox)
-            # flush any pending GUI events, re-painting the screen if needed
-            fig.canvas.flush_events()
         else:
             self.figure.canvas.schedule_draw()
 
@@ -209,6 +285,9 @@ class GrabbableRectangleSelection(GrabFunctions):
 
     def add_target(self, target: Artist):
         """add an artist to the selection"""
+        # a changed selection needs a new background
+        self.stop_blit()
+        self.commit_move()
         target_wrapped = TargetWrapper(target)
 
         new_points = np.array(target_wrapped.get_positions())
@@ -361,7 +440,7 @@ class GrabbableRectangleSelection(GrabFunctions):
             self.has_moved = True
             self.end_move()
 
-            self.figure.canvas.draw()
+            self.figure.canvas.draw_idle()
             self.update_selection_rectangles()
 
         def distribute(y: int):
@@ -385,7 +464,7 @@ class GrabbableRectangleSelection(GrabFunctions):
             self.has_moved = True
             self.end_move()
 
-            self.figure.canvas.draw()
+            self.figure.canvas.draw_idle()
             self.update_selection_rectangles()
 
         if mode == "center_x":
@@ -455,6 +534,8 @@ class GrabbableRectangleSelection(GrabFunctions):
         targets_non_wrapped = [t.target for t in self.targets]
         if target not in targets_non_wrapped:
             return
+        self.stop_blit()
+        self.commit_move()
         index = targets_non_wrapped.index(target)
         self.targets.pop(index)
         rect1 = self.targets_rects.pop(index * 2)
@@ -487,6 +568,8 @@ class GrabbableRectangleSelection(GrabFunctions):
 
     def clear_targets(self):
         """remove all elements from the selection"""
+        self.stop_blit()
+        self.commit_move()
         for rect in self.targets_rects:
             scene = self.graphics_scene.scene()
             if scene is not None:
@@ -557,24 +640,38 @@ class GrabbableRectangleSelection(GrabFunctions):
 
         return undo
 
+    def commit_move(self):
+        """record the changes of a move that did not end, e.g. when the selection changed during the move"""
+        change_tracker = getattr(self.figure, "change_tracker", None)
+        if change_tracker is not None:
+            change_tracker.commitTransaction()
+
     def start_move(self):
         """start to move a grabber"""
+        # a move that did not end is not continued
+        self.commit_move()
         self.start_p1 = self.p1.copy()
         self.start_p2 = self.p2.copy()
         self.hide_grabber()
         self.has_moved = False
 
         self.store_start = self.get_save_point()
+        # the changes of the move are recorded once when it ends
+        self.figure.change_tracker.beginTransaction()
 
-    def end_move(self):
-        """a grabber move stopped"""
+    def end_move(self, merge: bool = False):
+        """a grabber move stopped, with merge it can be merged with the previous move of the same targets"""
+        self.figure.change_tracker.commitTransaction()
         self.update_grabber()
 
         self.store_end = self.get_save_point()
         if self.has_moved is True:
             self.figure.signals.figure_selection_moved.emit()
+            merge_key = None
+            if merge:
+                merge_key = ("Move", tuple(target.target for target in self.targets))
             self.figure.change_tracker.addEdit(
-                [self.store_start, self.store_end, "Move"]
+                [self.store_start, self.store_end, "Move"], merge_key=merge_key
             )
 
     def addOffset(self, pos: Sequence, dir: int, keep_aspect_ratio: bool = True):
@@ -637,7 +734,7 @@ class GrabbableRectangleSelection(GrabFunctions):
         self,
         pos: Sequence[float],
         dir: int,
-        snaps: List[SnapBase],
+        snaps: List[SnapBase] | SnapEngine,
         keep_aspect_ratio: bool = False,
         ignore_snaps: bool = False,
     ):
@@ -649,8 +746,6 @@ class GrabbableRectangleSelection(GrabFunctions):
             offx, offy = checkSnaps(snaps)
             self.addOffset((pos[0] - offx, pos[1] - offy), dir, keep_aspect_ratio)
 
-            checkSnaps(self.snaps)
-
         checkSnapsActive(snaps)
 
     def apply_transform(self, transform: np.ndarray, point: Sequence[float]):
@@ -676,42 +771,42 @@ class GrabbableRectangleSelection(GrabFunctions):
                 self.figure.change_tracker.addChange(
                     target.target, ".set_zorder(%d)" % target.target.get_zorder()
                 )
-            self.figure.canvas.draw()
+            self.figure.canvas.draw_idle()
         if event.key == "pageup":
             for target in self.targets:
                 target.target.set_zorder(target.target.get_zorder() + 1)
                 self.figure.change_tracker.addChange(
                     target.target, ".set_zorder(%d)" % target.target.get_zorder()
                 )
-            self.figure.canvas.draw()
+            self.figure.canvas.draw_idle()
         if event.key == "left":
             self.start_move()
             self.addOffset((-1, 0), self.dir)
             self.has_moved = True
-            self.end_move()
+            self.end_move(merge=True)
             self.figure.canvas.schedule_draw()
         if event.key == "right":
             self.start_move()
             self.addOffset((+1, 0), self.dir)
             self.has_moved = True
-            self.end_move()
+            self.end_move(merge=True)
             self.figure.canvas.schedule_draw()
         if event.key == "down":
             self.start_move()
             self.addOffset((0, -1), self.dir)
             self.has_moved = True
-            self.end_move()
+            self.end_move(merge=True)
             self.figure.canvas.schedule_draw()
         if event.key == "up":
             self.start_move()
             self.addOffset((0, +1), self.dir)
             self.has_moved = True
-            self.end_move()
+            self.end_move(merge=True)
             self.figure.canvas.schedule_draw()
         if event.key == "delete":
             for target in self.targets[::-1]:
                 self.figure.change_tracker.removeElement(target.target)
-            self.figure.canvas.draw()
+            self.figure.canvas.draw_idle()
 
 
 class DragManager:
@@ -719,6 +814,8 @@ class DragManager:
 
     selected_element = None
     grab_element = None
+    # increased when artists are made draggable, to invalidate the cached pickable descendants
+    pickable_generation = 0
 
     def __init__(self, figure: Figure, no_save):
         self.figure = figure
@@ -731,8 +828,8 @@ class DragManager:
 
         self.activate()
 
-        self.make_figure_draggable(self.figure)
-        self.make_axes_draggable(self.figure.axes)
+        # the artists that were made draggable in addition to the texts, patches, legends and axes
+        self.selectable_artists: WeakSet[Artist] = WeakSet()
         graphics_scene = cast(
             "GraphicsRectItemWithView", getattr(figure, "_pyl_scene", None)
         )
@@ -762,42 +859,45 @@ class DragManager:
         self.selection.clear_targets()
         self.selected_element = None
         self.on_select(None, None)
-        self.figure.canvas.draw()
+        self.figure.canvas.draw_idle()
 
     def make_draggable(self, target: Artist):
         """make an artist draggable"""
-        target.set_picker(True)
-        if isinstance(target, Text):
-            target.set_bbox(dict(facecolor="none", edgecolor="none"))
-
-    def make_axes_draggable(self, axes: list[Axes]) -> None:
-        for index, ax in enumerate(axes):
-            ax.set_picker(True)
-            leg = ax.get_legend()
-            if leg:
-                self.make_draggable(leg)
-            for text in ax.texts:
-                self.make_draggable(text)
-            for attribute_name in ["title", "_left_title", "_right_title"]:
-                text = getattr(ax, attribute_name, None)
-                if text is not None:
-                    self.make_draggable(text)
-            for patch in ax.patches:
-                self.make_draggable(patch)
-            self.make_draggable(ax.xaxis.get_label())
-            self.make_draggable(ax.yaxis.get_label())
-            self.make_draggable(ax)
-            self.make_axes_draggable([a for a in ax.child_axes if isinstance(a, Axes)])
-
-    def make_figure_draggable(self, fig: Figure | SubFigure) -> None:
-        for text in fig.texts:
-            self.make_draggable(text)
-        for patch in fig.patches:
-            self.make_draggable(patch)
-        for leg in fig.legends:
-            self.make_draggable(leg)
-        for subfig in fig.subfigs:
-            self.make_figure_draggable(subfig)
+        self.selectable_artists.add(target)
+        self.pickable_generation += 1
+
+    def is_selectable(self, element: Artist | Figure, child: Artist) -> bool:
+        """whether the child of an element can be selected"""
+        if child in self.selectable_artists or child.pickable():
+            return True
+        # the texts, patches, legends and axes of figures and axes
+        if isinstance(element, (Figure, SubFigure, Axes)):
+            return (
+                isinstance(child, (Text, Patch, Legend, Axes))
+                and not isinstance(child, Spine)
+                and child is not element.patch
+            )
+        # and the labels of axis
+        if isinstance(element, Axis):
+            return child is element.label
+        return False
+
+    def get_pickable_descendants(self, element: Artist | Figure) -> list[Artist]:
+        """get the selectable artists in the subtree of an element
+        (cached until artists are made draggable or added to the element)"""
+        key = (self.pickable_generation, 0)
+        if isinstance(element, (Figure, SubFigure, Axes)):
+            key = (self.pickable_generation, len(element.get_children()))
+        cached = getattr(element, "_pylustrator_pickable_descendants", None)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        descendants = []
+        for child in cast(Artist, element).get_children():
+            if self.is_selectable(element, child):
+                descendants.append(child)
+            descendants.extend(self.get_pickable_descendants(child))
+        setattr(element, "_pylustrator_pickable_descendants", (key, descendants))
+        return descendants
 
     def get_picked_element(
         self,
@@ -805,14 +905,18 @@ class DragManager:
         element: Artist | Figure | None = None,
         picked_element: Artist | None = None,
         last_selected: Artist | None = None,
+        candidates: set | None = None,
     ):
         """get the picked element that an event refers to.
         To implement selection of elements at the back with multiple clicks.
         """
         if not isinstance(element, (Artist, Figure)):
             element = self.figure
+            # the artists of the spatial index that are under the cursor
+            candidates = getSpatialIndex(self.figure).query(event.x, event.y)
         if not isinstance(element, (Artist, Figure)):
             raise ValueError("element must be an Artist or Figure")
+        spatial_index = getSpatialIndex(self.figure) if candidates is not None else None
 
         finished = False
         # iterate over all children
@@ -828,20 +932,38 @@ class DragManager:
                 and isinstance(child_label, str)
                 and child_label.startswith("_")
             )
+            # test the cheap conditions first, contains can be expensive for large artists
             if (
                 child.get_visible()
-                and child.contains(event)[0]
-                and (child.pickable() or isinstance(child, GrabberGeneric))
                 and not is_underscored
+                and (
+                    self.is_selectable(element, child)
+                    or isinstance(child, GrabberGeneric)
+                )
+                and not (
+                    spatial_index is not None
+                    and spatial_index.excludes(child, candidates)
+                )
+                and child.contains(event)[0]
             ):
                 # if the element is the last selected, finish the search
                 if child == last_selected:
                     return picked_element, True
                 # use this element as the current best matching element
                 picked_element = child
+            # skip the subtree if none of its pickable artists can be under the cursor
+            if spatial_index is not None and all(
+                spatial_index.excludes(descendant, candidates)
+                for descendant in self.get_pickable_descendants(child)
+            ):
+                continue
             # iterate over the children's children
             picked_element, finished = self.get_picked_element(
-                event, child, picked_element, last_selected=last_selected
+                event,
+                child,
+                picked_element,
+                last_selected=last_selected,
+                candidates=candidates,
             )
             # if the subcall wants to finish, just break the loop
             if finished:
@@ -926,7 +1048,7 @@ class DragManager:
         self.selection.clear_targets()
         self.selected_element = None
         self.on_select(None, None)
-        self.figure.canvas.draw()
+        self.figure.canvas.draw_idle()
 
     def redo(self):
         print("forward edit")
@@ -934,7 +1056,7 @@ class DragManager:
         self.selection.clear_targets()
         self.selected_element = None
         self.on_select(None, None)
-        self.figure.canvas.draw()
+        self.figure.canvas.draw_idle()
 
     def key_press_event(self, event: Event):
         """when a key is pressed"""
@@ -950,7 +1072,7 @@ class DragManager:
             self.selection.clear_targets()
             self.selected_element = None
             self.on_select(None, None)
-            self.figure.canvas.draw()
+            self.figure.canvas.draw_idle()
 
 
 class GrabberGeneric(GrabFunctions):
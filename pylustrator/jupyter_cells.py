@@ -24,6 +24,10 @@ This file implements pylustrator for jupyter notebooks. Basically it provides an
 the file is instead of a normal file a jupyter notebook and redirects writes accordingly.
 """
 
+import os
+import shutil
+import tempfile
+
 
 def setJupyterCellText(text: str):
     """the function replaces the text in the current jupyter cell with the given text"""
@@ -68,9 +72,14 @@ global_files = {}
 build_in_open = open
 
 
+def isJupyterCell(filename: str) -> bool:
+    """whether the filename refers to a jupyter cell instead of a file"""
+    return filename.startswith("<ipython") or "ipykernel" in filename
+
+
 def open(filename: str, *args, **kwargs):
     """open a file and if its a jupyter cell then mock a filepointer to that cell"""
-    if filename.startswith("<ipython") or "ipykernel" in filename:
+    if isJupyterCell(filename):
 
         class IPythonCell:
             text: str | None = None
@@ -125,3 +134,32 @@ def open(filename: str, *args, **kwargs):
         return IPythonCell(filename, *args, **kwargs)
     else:
         return build_in_open(filename, *args, **kwargs)
+
+
+def writeFileAtomic(filename: str, text: str):
+    """write the text to the file by replacing it with a temporary file, so that the file is never left half written"""
+    if isJupyterCell(filename):
+        with open(filename, "w", encoding="utf-8") as fp:
+            fp.write(text)
+        return
+
+    # the temporary file has to be in the same directory, as os.replace cannot move files between file systems
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(
+        dir=directory, prefix=os.path.basename(filename) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fp:
+            fp.write(text)
+            fp.flush()
+            os.fsync(fp.fileno())
+        # keep the permissions of the original file
+        try:
+            shutil.copymode(filename, tmp_filename)
+        except OSError:
+            pass
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
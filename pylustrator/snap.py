@@ -19,7 +19,8 @@
 # You should have received a copy of the GNU General Public License
 # along with Pylustrator. If not, see <http://www.gnu.org/licenses/>
 
-from typing import TYPE_CHECKING, List, Optional, Tuple, Any, Sequence, cast
+import bisect
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Any, Sequence, cast
 from packaging import version
 from numpy.typing import NDArray
 
@@ -40,10 +41,14 @@ from matplotlib.legend import Legend
 from matplotlib.patches import Patch, Rectangle, Ellipse, FancyArrowPatch
 from matplotlib.text import Text
 from matplotlib.figure import Figure
+from matplotlib.transforms import Bbox, Transform
 
 from matplotlib.figure import SubFigure  # since matplotlib 3.4.0
 from .helper_functions import main_figure
 
+# the patches whose extent is known to TargetWrapper
+indexed_patches = (Rectangle, Ellipse, FancyArrowPatch)
+
 # Type alias for a 2D point - internally always a numpy array
 Point = NDArray[np.floating[Any]]
 PointList = List[Point]
@@ -79,6 +84,24 @@ def checkYLabel(target: Artist):
             return axes
 
 
+def invertedTransform(transform: Transform) -> Transform:
+    """get the inverse of a transform, the inverse of affine transforms is cached until their matrix changes"""
+    # the inverse of a non-affine transform (e.g. of a log scale) can change without a change of the affine part
+    if not transform.is_affine:
+        return transform.inverted()
+    key = transform.get_affine().get_matrix().tobytes()
+    cached = getattr(transform, "_pylustrator_inverted", None)
+    if cached is None or cached[0] != key:
+        cached = (key, transform.inverted())
+        setattr(transform, "_pylustrator_inverted", cached)
+    return cached[1]
+
+
+def clearExtentCache(artist: Artist):
+    """clear the cached extent of an artist"""
+    setattr(artist, "_pylustrator_cached_get_extend", None)
+
+
 def cache_property(object, name):
     if getattr(object, f"_pylustrator_cached_{name}", False) is True:
         return
@@ -210,6 +233,11 @@ class TargetWrapper(object):
                         )
                     )
                 )
+            else:
+                # without a bbox patch, span the window extent of the text
+                extent = self.target.get_window_extent()
+                points.append(_to_point((extent.x0, extent.y0)))
+                points.append(_to_point((extent.x1, extent.y1)))
             points[-2:] = self.transform_inverted_points(points[-2:])
             if use_previous_offset is True:
                 offset = getattr(self.target, "_pylustrator_offset", _to_point((0, 0)))
@@ -239,7 +267,7 @@ class TargetWrapper(object):
             if isinstance(self.target._get_loc(), int):
                 # if the legend doesn't have a location yet, use the left bottom corner of the bounding box
                 self.target._set_loc(
-                    tuple(transform.inverted().transform(tuple([bbox.x0, bbox.y0])))
+                    tuple(invertedTransform(transform).transform((bbox.x0, bbox.y0)))
                 )
             points.append(_to_point(transform.transform(self.target._get_loc())))
             # add points to span bounding box around the frame
@@ -344,7 +372,7 @@ class TargetWrapper(object):
                 transform = self.target.figure.transFigure
             else:
                 transform = self.target.figure.transSubfigure
-            point = transform.inverted().transform(pts[0])
+            point = invertedTransform(transform).transform(pts[0])
             self.target._loc = tuple(point)  # ty:ignore[invalid-assignment]
             change_tracker.addNewLegendChange(self.target)
             # change_tracker.addChange(self.target, "._set_loc((%f, %f))" % tuple(point))
@@ -360,15 +388,72 @@ class TargetWrapper(object):
             change_tracker.addNewAxesChange(self.target)
             # change_tracker.addChange(self.target, ".set_position([%f, %f, %f, %f])" % tuple(
             #    np.array([pts[0], pts[1] - pts[0]]).flatten()))
-        setattr(self.target, "_pylustrator_cached_get_extend", None)
+        clearExtentCache(self.target)
+        invalidateSpatialIndex(self.target)
 
     def get_extent(self) -> Tuple[float, float, float, float]:
-        # get get_extent as it can be called very frequently when checking snap conditions
-        if getattr(self.target, "_pylustrator_cached_get_extend_added", False):
+        # cache get_extent as it can be called very frequently when checking snap conditions
+        if not getattr(self.target, "_pylustrator_cached_get_extend_added", False):
+            # changing properties with Artist.set clears the cache
+            self.target.add_callback(clearExtentCache)
             setattr(self.target, "_pylustrator_cached_get_extend_added", True)
-        if getattr(self.target, "_pylustrator_cached_get_extend", None) is None:
-            setattr(self.target, "_pylustrator_cached_get_extend", self.do_get_extent())
-        return getattr(self.target, "_pylustrator_cached_get_extend")
+        # the cached extent is only valid as long as the state it was computed from is unchanged
+        key = self.get_extent_key()
+        cached = getattr(self.target, "_pylustrator_cached_get_extend", None)
+        if cached is None or cached[0] != key:
+            cached = (key, self.do_get_extent())
+            setattr(self.target, "_pylustrator_cached_get_extend", cached)
+        return cached[1]
+
+    def get_extent_key(self) -> tuple:
+        """get the state of the target and its transform that the extent depends on"""
+        target = self.target
+        key: list = [
+            self.figure.dpi,
+            tuple(self.figure.bbox.bounds),
+            self.get_transform().get_affine().get_matrix().tobytes(),
+        ]
+        if isinstance(target, Rectangle):
+            key.append(
+                (target.get_x(), target.get_y(), target.get_width(), target.get_height())
+            )
+        elif isinstance(target, Ellipse):
+            key.append((tuple(np.ravel(target.center)), target.width, target.height))
+        elif isinstance(target, FancyArrowPatch):
+            key.append(target.get_path().vertices.tobytes())
+        elif isinstance(target, Text):
+            key.append(tuple(np.ravel(target.get_position())))
+            key.append(getattr(self, "label_x", None))
+            key.append(getattr(self, "label_y", None))
+            if getattr(target, "xy", None) is not None:
+                key.append(tuple(np.ravel(target.xy)))  # ty:ignore[unresolved-attribute]
+            bbox = target.get_bbox_patch()
+            if bbox:
+                key.append(
+                    (bbox.get_x(), bbox.get_y(), bbox.get_width(), bbox.get_height())
+                )
+                key.append(bbox.get_transform().get_affine().get_matrix().tobytes())
+            else:
+                # the properties that the window extent of the text depends on
+                key.append(
+                    (
+                        target.get_text(),
+                        hash(target.get_fontproperties()),
+                        target.get_rotation(),
+                        target.get_horizontalalignment(),
+                        target.get_verticalalignment(),
+                        target.get_linespacing(),
+                        target.get_visible(),
+                    )
+                )
+        elif isinstance(target, Axes):
+            key.append(tuple(target.get_position().bounds))
+        elif isinstance(target, SubFigure):
+            key.append(tuple(target.bbox.bounds))
+        elif isinstance(target, Legend):
+            key.append(tuple(target.get_frame().get_bbox().bounds))
+            key.append(str(target._get_loc()))
+        return tuple(key)
 
     def do_get_extent(self) -> Tuple[float, float, float, float]:
         """get the extent of the target"""
@@ -383,12 +468,222 @@ class TargetWrapper(object):
     def transform_points(self, points: Sequence[Point]) -> PointList:
         """transform points from the targets local coordinate system to the figure coordinate system"""
         transform = self.get_transform()
-        return [_to_point(transform.transform(p)) for p in points]
+        # transform all points in one call
+        points_array = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return list(transform.transform(points_array))
 
     def transform_inverted_points(self, points: Sequence[Point]) -> PointList:
         """transform points from the figure coordinate system to the targets local coordinate system"""
-        transform = self.get_transform()
-        return [_to_point(transform.inverted().transform(p)) for p in points]
+        transform = invertedTransform(self.get_transform())
+        # transform all points in one call
+        points_array = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return list(transform.transform(points_array))
+
+
+def wrapTarget(target: Artist | TargetWrapper) -> TargetWrapper:
+    """wrap an artist with a TargetWrapper, if it is not already wrapped"""
+    if isinstance(target, TargetWrapper):
+        return target
+    return TargetWrapper(target)
+
+
+class SpatialIndex:
+    """A grid of buckets over the extents (in display pixels) of the selectable artists of a figure, used for picking.
+
+    The extents are computed when the index is built and updated for single artists when they are moved with
+    TargetWrapper.set_positions or changed in the ChangeTracker. Artists that are not in the index (e.g. because
+    their extent is not known) are never excluded by a query. The index only restricts picking to the artists
+    under the cursor, getSnaps does not use it.
+    """
+
+    # the size of a bucket in pixels
+    cell_size = 64
+    # a tolerance in pixels, e.g. for the linewidth of patches
+    margin = 5
+
+    def __init__(self, figure: Figure):
+        self.figure = figure
+        self.extents = {}
+        self.buckets = {}
+        self.children = {}
+        self.known = set()
+        self.pending = set()
+        self.state = None
+
+    def getState(self):
+        """the dpi, size and axes of the figure, if they change the index is rebuilt"""
+        return self.figure.dpi, tuple(self.figure.bbox.size), tuple(self.figure.axes)
+
+    def getArtists(self) -> List[Tuple[Artist, Optional[Artist]]]:
+        """get the artists to index together with the axes they belong to"""
+        artists: List[Tuple[Artist, Optional[Artist]]] = []
+
+        def add_axes(axes_list):
+            for ax in axes_list:
+                artists.append((ax, None))
+                children = list(ax.texts) + [
+                    ax.title,
+                    ax._left_title,
+                    ax._right_title,
+                    ax.xaxis.get_label(),
+                    ax.yaxis.get_label(),
+                ]
+                children += [p for p in ax.patches if isinstance(p, indexed_patches)]
+                if ax.get_legend() is not None:
+                    children.append(ax.get_legend())
+                artists.extend((child, ax) for child in children)
+                add_axes([a for a in ax.child_axes if isinstance(a, Axes)])
+
+        def add_figure(fig):
+            add_axes(fig.axes)
+            artists.extend((text, None) for text in fig.texts)
+            artists.extend(
+                (p, None) for p in fig.patches if isinstance(p, indexed_patches)
+            )
+            artists.extend((legend, None) for legend in fig.legends)
+            for subfig in fig.subfigs:
+                add_figure(subfig)
+
+        add_figure(self.figure)
+        return artists
+
+    def getExtent(self, artist: Artist) -> Optional[Tuple[float, ...]]:
+        """get the extent of an artist in display pixels or None if it is not known"""
+        try:
+            if isinstance(artist, Text):
+                # texts are picked by their window extent and their bbox patch
+                extent = artist.get_window_extent()
+                bbox = artist.get_bbox_patch()
+                if bbox is not None:
+                    extent = Bbox.union([extent, bbox.get_window_extent()])
+                return extent.x0, extent.y0, extent.x1, extent.y1
+            extent = TargetWrapper(artist).get_extent()
+        except (ValueError, AttributeError, IndexError):
+            return None
+        if not np.all(np.isfinite(extent)):
+            return None
+        return tuple(float(v) for v in extent)
+
+    def getCells(self, extent: Tuple[float, float, float, float]):
+        """the buckets covered by an extent"""
+        x0, y0, x1, y1 = (int(np.floor(v / self.cell_size)) for v in extent)
+        return [(i, j) for i in range(x0, x1 + 1) for j in range(y0, y1 + 1)]
+
+    def build(self):
+        """compute the extents of all artists"""
+        self.extents = {}
+        self.buckets = {}
+        self.children = {}
+        self.known = set()
+        self.pending = set()
+        self.state = self.getState()
+        for artist, owner in self.getArtists():
+            self.known.add(artist)
+            if owner is not None:
+                self.children.setdefault(owner, []).append(artist)
+            self.add(artist)
+
+    def add(self, artist: Artist):
+        """add an artist with its current extent"""
+        extent = self.getExtent(artist)
+        if extent is None:
+            return
+        x0, y0, x1, y1 = extent
+        m = self.margin
+        extent = (x0 - m, y0 - m, x1 + m, y1 + m)
+        self.extents[artist] = extent
+        for cell in self.getCells(extent):
+            self.buckets.setdefault(cell, set()).add(artist)
+
+    def remove(self, artist: Artist):
+        """remove an artist from the index"""
+        extent = self.extents.pop(artist, None)
+        if extent is None:
+            return
+        for cell in self.getCells(extent):
+            bucket = self.buckets.get(cell)
+            if bucket is not None:
+                bucket.discard(artist)
+                if not bucket:
+                    del self.buckets[cell]
+
+    def invalidate(self, artist: Artist):
+        """the artist changed, its extent (and the extents of the artists of an axes) is updated on the next query"""
+        if artist not in self.known:
+            return
+        for target in [artist] + self.children.get(artist, []):
+            self.remove(target)
+            self.pending.add(target)
+
+    def update(self):
+        """rebuild the index if the figure changed its size or axes and update the changed artists"""
+        if self.state != self.getState():
+            self.build()
+        for artist in self.pending:
+            self.add(artist)
+        self.pending = set()
+
+    def query(self, x: float, y: float) -> set:
+        """get the artists whose extent contains the point"""
+        self.update()
+        cell = (int(np.floor(x / self.cell_size)), int(np.floor(y / self.cell_size)))
+        candidates = set()
+        for artist in self.buckets.get(cell, ()):
+            x0, y0, x1, y1 = self.extents[artist]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                candidates.add(artist)
+        return candidates
+
+    def excludes(self, artist: Artist, candidates: set) -> bool:
+        """whether an artist is known to be not under the point of a query that returned the candidates"""
+        return artist in self.extents and artist not in candidates
+
+
+def getSpatialIndex(figure: Figure) -> SpatialIndex:
+    """get the spatial index of a figure"""
+    figure = main_figure(figure)
+    index = getattr(figure, "_pylustrator_spatial_index", None)
+    if index is None:
+        index = SpatialIndex(figure)
+        index.build()
+        setattr(figure, "_pylustrator_spatial_index", index)
+    return index
+
+
+def invalidateSpatialIndex(artist: Artist):
+    """update the extent of a changed artist in the spatial index of its figure, if there is one"""
+    index = getattr(main_figure(artist), "_pylustrator_spatial_index", None)
+    if index is not None:
+        index.invalidate(artist)
+
+
+def getSnapPath(figure: Figure) -> QtWidgets.QGraphicsPathItem:
+    """get a line object for the visualisation of a snap, reusing a released one if possible"""
+    figure = main_figure(figure)
+    parent = figure._pyl_graphics_scene_snapparent
+    pool = getattr(figure, "_pyl_snap_path_pool", [])
+    while pool:
+        draw_path = pool.pop()
+        # the scene could have been replaced since the line was released
+        if draw_path.scene() is parent.scene():
+            draw_path.setVisible(True)
+            return draw_path
+    draw_path = QtWidgets.QGraphicsPathItem()
+    parent.scene().addItem(draw_path)
+    pen1 = QtGui.QPen(QtGui.QColor("red"), 2)
+    pen1.setStyle(QtCore.Qt.PenStyle.DashLine)
+    draw_path.setPen(pen1)
+    return draw_path
+
+
+def releaseSnapPath(figure: Figure, draw_path: QtWidgets.QGraphicsPathItem):
+    """hide a line object of a snap and keep it for the next snap that is shown"""
+    figure = main_figure(figure)
+    draw_path.setPath(QtGui.QPainterPath())
+    draw_path.setVisible(False)
+    if not hasattr(figure, "_pyl_snap_path_pool"):
+        figure._pyl_snap_path_pool = []
+    figure._pyl_snap_path_pool.append(draw_path)
 
 
 class SnapBase:
@@ -396,18 +691,18 @@ class SnapBase:
 
     data = None
 
-    def __init__(self, ax_source: Artist, ax_target: Artist, edge: int):
+    def __init__(
+            self,
+            ax_source: Artist | TargetWrapper,
+            ax_target: Artist | TargetWrapper,
+            edge: int,
+    ):
         # wrap both object with a TargetWrapper
-        self.ax_source = TargetWrapper(ax_source)
-        self.ax_target = TargetWrapper(ax_target)
+        self.ax_source = wrapTarget(ax_source)
+        self.ax_target = wrapTarget(ax_target)
         self.edge = edge
-        # initialize a line object for the visualisation of the snap
-        self.draw_path = QtWidgets.QGraphicsPathItem()
-        parent = main_figure(ax_source)._pyl_graphics_scene_snapparent
-        parent.scene().addItem(self.draw_path)
-        pen1 = QtGui.QPen(QtGui.QColor("red"), 2)
-        pen1.setStyle(QtCore.Qt.PenStyle.DashLine)
-        self.draw_path.setPen(pen1)
+        # the line object for the visualisation is only created when the snap is shown
+        self.draw_path: Optional[QtWidgets.QGraphicsPathItem] = None
 
     def getPosition(self, target: TargetWrapper) -> Tuple[float, float, float, float]:
         """get the position of a target"""
@@ -465,22 +760,22 @@ class SnapBase:
                 else:
                     painter_path.lineTo(x, y)
                     current_pos = (x, y)
+        if self.draw_path is None:
+            self.draw_path = getSnapPath(self.ax_source.figure)
         self.draw_path.setPath(painter_path)
         self.data = (xdata, ydata)
 
     def hide(self):
         """Hides the visualisation"""
-        self.set_data((), ())
+        if self.draw_path is not None:
+            releaseSnapPath(self.ax_source.figure, self.draw_path)
+            self.draw_path = None
+        self.data = ((), ())
 
     def remove(self):
         """Remove the snap and its visualisation"""
         self.hide()
 
-        scene = self.draw_path.scene()
-        if scene is None:
-            return
-        scene.removeItem(self.draw_path)
-
 
 class SnapSameEdge(SnapBase):
     """a snap that checks if two objects share an edge"""
@@ -607,10 +902,14 @@ class SnapSameBorder(SnapBase):
     """A snap that checks if tree axes share the space between them"""
 
     def __init__(
-            self, ax_source: Artist, ax_target: Artist, ax_target2: Artist, edge: int
+            self,
+            ax_source: Artist | TargetWrapper,
+            ax_target: Artist | TargetWrapper,
+            ax_target2: Artist | TargetWrapper,
+            edge: int,
     ):
         super().__init__(ax_source, ax_target, edge)
-        self.ax_target2 = TargetWrapper(ax_target2)
+        self.ax_target2 = wrapTarget(ax_target2)
 
     def overlap(
             self,
@@ -740,8 +1039,179 @@ class SnapCenterWith(SnapBase):
         self.set_data((p1[0], p2[0]), (p1[1], p2[1]))
 
 
-def checkSnaps(snaps: List[SnapBase]) -> list[float]:
+class SnapEngine:
+    """Evaluates a list of snaps with vectorized numpy operations.
+
+    The snap targets do not move during a drag, therefore their positions are packed into arrays when the engine is
+    created (at the start of the drag). For every mouse move only the positions of the dragged objects are updated
+    and the distances of all snaps are computed at once.
+    """
+
+    def __init__(self, snaps: List[SnapBase]):
+        self.snaps = snaps
+        self.shown = np.zeros(len(snaps), dtype=bool)
+
+        # the positions of the dragged objects, as extents or as the position of a text
+        self.sources: List[Tuple[SnapBase, TargetWrapper]] = []
+        source_indices = {}
+
+        def source_index(snap: SnapBase) -> int:
+            is_point = isinstance(snap, (SnapSamePos, SnapCenterWith))
+            key = (snap.ax_source.target, is_point)
+            if key not in source_indices:
+                source_indices[key] = len(self.sources)
+                self.sources.append((snap, snap.ax_source))
+            return source_indices[key]
+
+        # snaps that are a linear function of the source position: w_a * p1[a] + w_b * p1[b] + offset
+        linear = []
+        # snaps that check the space between two target axes
+        border = []
+        for index, snap in enumerate(snaps):
+            if isinstance(snap, SnapSameBorder):
+                p2 = snap.getPosition(snap.ax_target)
+                p3 = snap.getPosition(snap.ax_target2)
+                borders = snap.getBorders(p2, p3)
+                border.append((index, source_index(snap), snap.edge, p2, borders))
+            elif isinstance(snap, SnapSameDimension):
+                p2 = snap.getPosition(snap.ax_target)
+                a = (snap.edge - 2) % 4
+                offset = p2[a] - p2[snap.edge]
+                linear.append((index, source_index(snap), a, -1, snap.edge, 1, offset))
+            elif isinstance(snap, SnapCenterWith):
+                p2 = snap.getPosition2(snap.ax_target)
+                e = snap.edge
+                linear.append((index, source_index(snap), e, 1, e, 0, -p2[e]))
+            else:
+                p2 = snap.getPosition(snap.ax_target)
+                e = snap.edge
+                linear.append((index, source_index(snap), e, 1, e, 0, -p2[e]))
+
+        columns = list(zip(*linear)) if len(linear) else [[]] * 7
+        self.linear_index = np.array(columns[0], dtype=int)
+        self.linear_source = np.array(columns[1], dtype=int)
+        self.linear_a = np.array(columns[2], dtype=int)
+        self.linear_weight_a = np.array(columns[3], dtype=float)
+        self.linear_b = np.array(columns[4], dtype=int)
+        self.linear_weight_b = np.array(columns[5], dtype=float)
+        self.linear_offset = np.array(columns[6], dtype=float)
+        # the distance of these snaps only applies to the x or to the y dimension
+        self.linear_axis = self.linear_b % 2
+
+        self.border_index = np.array([b[0] for b in border], dtype=int)
+        self.border_source = np.array([b[1] for b in border], dtype=int)
+        flags = np.array([b[2] for b in border], dtype=int)
+        self.border_has_x1 = ((flags & DIR_X1) != 0) | ((flags & DIR_Y1) != 0)
+        self.border_has_x0 = ((flags & DIR_X0) != 0) | ((flags & DIR_Y0) != 0)
+        self.border_p2 = np.array([b[3] for b in border], dtype=float).reshape(-1, 4)
+        # the borders between the two targets, padded with infinite distances
+        count = max([len(b[4]) for b in border] + [1])
+        self.border_dirs = np.zeros((len(border), count), dtype=int)
+        self.border_distances = np.full((len(border), count), np.inf)
+        for i, b in enumerate(border):
+            if len(b[4]):
+                self.border_dirs[i, : len(b[4])] = b[4][:, 0]
+                self.border_distances[i, : len(b[4])] = b[4][:, 1]
+        self.border_dir1 = np.zeros((len(border), 2), dtype=int)
+        self.border_dir2 = np.zeros((len(border), 2), dtype=int)
+
+    def getSourcePositions(self) -> np.ndarray:
+        """get the current positions of the dragged objects as an array of extents"""
+        positions = np.zeros((len(self.sources), 4))
+        for i, (snap, source) in enumerate(self.sources):
+            p = np.asarray(snap.getPosition(source), dtype=float)
+            positions[i] = p if len(p) == 4 else (p[0], p[1], p[0], p[1])
+        return positions
+
+    def getDistances(self) -> np.ndarray:
+        """the distances of all snaps in x and y, infinite if a snap does not apply"""
+        distances = np.full((len(self.snaps), 2), np.inf)
+        if len(self.snaps) == 0:
+            return distances
+        positions = self.getSourcePositions()
+
+        # the linear snaps
+        p1 = positions[self.linear_source]
+        rows = np.arange(len(self.linear_index))
+        values = (
+            self.linear_weight_a * p1[rows, self.linear_a]
+            + self.linear_weight_b * p1[rows, self.linear_b]
+            + self.linear_offset
+        )
+        distances[self.linear_index, self.linear_axis] = values
+
+        # the snaps to the space between two axes
+        if len(self.border_index):
+            p1 = positions[self.border_source]
+            p2 = self.border_p2
+            rows = np.arange(len(self.border_index))
+            for edge in [0, 1]:
+                before = p1[:, edge + 2] < p2[:, edge]
+                after = p1[:, edge] > p2[:, edge + 2]
+                other = 1 - edge
+                overlap = ~(
+                    (p1[:, other + 2] < p2[:, other]) | (p1[:, other] > p2[:, other + 2])
+                )
+                valid = (before | after) & overlap
+                valid &= ~(~self.border_has_x1 & before)
+                valid &= ~(~self.border_has_x0 & after)
+                gaps = np.array(
+                    [p2[:, edge] - p1[:, edge + 2], p1[:, edge] - p2[:, edge + 2]]
+                ).T
+                index1 = np.argmax(gaps, axis=1)
+                gap = gaps[rows, index1]
+                # the border that is closest to the gap
+                deltas = gap[:, None] - self.border_distances
+                index2 = np.argmin(np.abs(deltas), axis=1)
+                delta = deltas[rows, index2]
+                valid &= np.isfinite(self.border_distances[rows, index2])
+                self.border_dir1[:, edge] = edge * 2 + index1
+                self.border_dir2[:, edge] = self.border_dirs[rows, index2]
+                distances[self.border_index, edge] = np.where(
+                    valid, delta * (-1 + 2 * index1), np.inf
+                )
+        return distances
+
+    def checkSnaps(self) -> list[float]:
+        """get the x and y offsets the snaps suggest"""
+        distances = self.getDistances()
+        result: list[float] = [0, 0]
+        for index in range(2):
+            absolute = np.abs(distances[:, index])
+            candidates = np.where(absolute < 10, absolute, np.inf)
+            if len(candidates) and np.isfinite(candidates.min()):
+                result[index] = float(distances[np.argmin(candidates), index])
+        return result
+
+    def checkSnapsActive(self):
+        """check if snaps are active and show them if yes"""
+        distances = self.getDistances()
+        active = np.abs(np.min(distances, axis=1)) < 1
+        for index in np.nonzero(active)[0]:
+            snap = self.snaps[index]
+            if isinstance(snap, SnapSameBorder):
+                # the directions of the last dimension with a valid distance are shown
+                i = np.nonzero(self.border_index == index)[0][0]
+                edge = 1 if np.isfinite(distances[index, 1]) else 0
+                snap.dir1 = self.border_dir1[i, edge]
+                snap.dir2 = self.border_dir2[i, edge]
+            snap.show()
+        for index in np.nonzero(self.shown & ~active)[0]:
+            self.snaps[index].hide()
+        self.shown = active
+
+    def remove(self):
+        """remove all snaps and their visualisation"""
+        for snap in self.snaps:
+            snap.remove()
+        self.snaps = []
+        self.shown = np.zeros(0, dtype=bool)
+
+
+def checkSnaps(snaps: List[SnapBase] | SnapEngine) -> list[float]:
     """get the x and y offsets the snaps suggest"""
+    if isinstance(snaps, SnapEngine):
+        return snaps.checkSnaps()
     result: list[float] = [0, 0]
     # iterate over x and y
     for index in range(2):
@@ -758,24 +1228,75 @@ def checkSnaps(snaps: List[SnapBase]) -> list[float]:
     return result
 
 
-def checkSnapsActive(snaps: List[SnapBase]):
+def checkSnapsActive(snaps: List[SnapBase] | SnapEngine):
     """check if snaps are active and show them if yes"""
+    if isinstance(snaps, SnapEngine):
+        return snaps.checkSnapsActive()
     for snap in snaps:
         snap.checkSnapActive()
 
 
+def getBorderNeighbors(axes_list: List[Axes]) -> Dict[Axes, List[Axes]]:
+    """get for every axes the axes next to it, i.e. the closest axes to the right and to the top that overlap with
+    it in the other dimension. Only the space between neighbors is used for SnapSameBorder."""
+    extents = np.array(
+        [TargetWrapper(axes).get_extent() for axes in axes_list], dtype=float
+    ).reshape(-1, 4)
+    neighbors: Dict[Axes, List[Axes]] = {axes: [] for axes in axes_list}
+    for edge in [0, 1]:
+        other = 1 - edge
+        # the axes sorted by their lower edge in this dimension
+        order = np.argsort(extents[:, edge], kind="stable")
+        starts = extents[order, edge]
+        for i, extent in enumerate(extents):
+            closest = None
+            # only axes that start after the end of this axes
+            for j in order[bisect.bisect_right(starts, extent[edge + 2]):]:
+                start = extents[j, edge]
+                if closest is not None and start > closest:
+                    break
+                # the axes have to overlap in the other dimension
+                if (
+                        extent[other + 2] < extents[j, other]
+                        or extent[other] > extents[j, other + 2]
+                ):
+                    continue
+                closest = start
+                neighbors[axes_list[i]].append(axes_list[j])
+                neighbors[axes_list[j]].append(axes_list[i])
+    # keep the order of the axes in the figure
+    indices = {axes: index for index, axes in enumerate(axes_list)}
+    return {
+        axes: sorted(set(others), key=indices.__getitem__)
+        for axes, others in neighbors.items()
+    }
+
+
 def getSnaps(targets: List[TargetWrapper], dir: int, no_height=False) -> List[SnapBase]:
-    """get all snap objects for the target and the direction"""
+    """get all snap objects for the target and the direction.
+
+    The snaps align edges and positions across the whole figure, so all axes and texts are candidates, also the
+    ones far away from the target.
+    """
     snaps = []
     target_artists: List[Artist] = [t.target for t in targets]
+    border_neighbors = {}
+    # the snaps share one TargetWrapper for each artist
+    wrappers: Dict[Artist, TargetWrapper] = {t.target: t for t in targets}
+
+    def wrap(artist: Artist) -> TargetWrapper:
+        if artist not in wrappers:
+            wrappers[artist] = TargetWrapper(artist)
+        return wrappers[artist]
+
     for target in target_artists:
         if isinstance(target, Legend):
             continue
         if isinstance(target, Text):
             if checkXLabel(target):
-                snaps.append(SnapCenterWith(target, checkXLabel(target), 0))
+                snaps.append(SnapCenterWith(wrap(target), wrap(checkXLabel(target)), 0))
             elif checkYLabel(target):
-                snaps.append(SnapCenterWith(target, checkYLabel(target), 1))
+                snaps.append(SnapCenterWith(wrap(target), wrap(checkYLabel(target)), 1))
             for ax in target.figure.axes + [target.figure]:
                 for txt in ax.texts:
                     # for other texts
@@ -783,37 +1304,41 @@ def getSnaps(targets: List[TargetWrapper], dir: int, no_height=False) -> List[Sn
                         continue
                     # snap to the x and the y coordinate
                     x, y = txt.get_transform().transform(txt.get_position())
-                    snaps.append(SnapSamePos(target, txt, 0))
-                    snaps.append(SnapSamePos(target, txt, 1))
+                    snaps.append(SnapSamePos(wrap(target), wrap(txt), 0))
+                    snaps.append(SnapSamePos(wrap(target), wrap(txt), 1))
             continue
+        if target.figure not in border_neighbors:
+            border_neighbors[target.figure] = getBorderNeighbors(
+                [
+                    axes
+                    for axes in target.figure.axes
+                    if axes not in target_artists and axes.get_visible()
+                ]
+            )
         for index, axes in enumerate(target.figure.axes):
             if axes not in target_artists and axes.get_visible():
                 # axes edged
                 if dir & DIR_X0:
-                    snaps.append(SnapSameEdge(target, axes, 0))
+                    snaps.append(SnapSameEdge(wrap(target), wrap(axes), 0))
                 if dir & DIR_Y0:
-                    snaps.append(SnapSameEdge(target, axes, 1))
+                    snaps.append(SnapSameEdge(wrap(target), wrap(axes), 1))
                 if dir & DIR_X1:
-                    snaps.append(SnapSameEdge(target, axes, 2))
+                    snaps.append(SnapSameEdge(wrap(target), wrap(axes), 2))
                 if dir & DIR_Y1:
-                    snaps.append(SnapSameEdge(target, axes, 3))
+                    snaps.append(SnapSameEdge(wrap(target), wrap(axes), 3))
 
                 # snap same dimensions
                 if not no_height:
                     if dir & DIR_X0:
-                        snaps.append(SnapSameDimension(target, axes, 0))
+                        snaps.append(SnapSameDimension(wrap(target), wrap(axes), 0))
                     if dir & DIR_X1:
-                        snaps.append(SnapSameDimension(target, axes, 2))
+                        snaps.append(SnapSameDimension(wrap(target), wrap(axes), 2))
                     if dir & DIR_Y0:
-                        snaps.append(SnapSameDimension(target, axes, 1))
+                        snaps.append(SnapSameDimension(wrap(target), wrap(axes), 1))
                     if dir & DIR_Y1:
-                        snaps.append(SnapSameDimension(target, axes, 3))
-
-                for axes2 in target.figure.axes:
-                    if (
-                            axes2 != axes
-                            and axes2 not in target_artists
-                            and axes2.get_visible()
-                    ):
-                        snaps.append(SnapSameBorder(target, axes, axes2, dir))
+                        snaps.append(SnapSameDimension(wrap(target), wrap(axes), 3))
+
+                # the space between the axes and its neighbors
+                for axes2 in border_neighbors[target.figure][axes]:
+                    snaps.append(SnapSameBorder(wrap(target), wrap(axes), axes2, dir))
     return snaps
@@ -1,5 +1,8 @@
 import numpy as np
-from base_test_class import BaseTest, NotInSave
+from matplotlib.backend_bases import MouseEvent
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from base_test_class import BaseTest, NotInSave, select_elements
 
 
 class TestAxes(BaseTest):
@@ -38,6 +41,67 @@ class TestAxes(BaseTest):
         # the output should still be the same
         self.assertEqual(text, self.get_script_text(), "Saved differently")
 
+    def test_drag_axes(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        ax = fig.axes[0]
+        label = ax.yaxis.get_label()
+        select_elements(fig, [ax, label])
+        start = np.array(ax.get_position())
+
+        # drag the selection with the mouse
+        selection = fig.selection
+        selection.button_press_event(MouseEvent("press", fig.canvas, 100, 100))
+        # a click alone does not cache a background
+        self.assertIsNone(selection.blit_background)
+        for x in [105, 110, 120]:
+            selection.on_motion(MouseEvent("move", fig.canvas, x, 100))
+        # the motions are coalesced and only the latest one is processed
+        self.assertIsNone(selection.blit_background)
+        fig.canvas.process_frame()
+        self.assertIsNone(selection.pending_motion)
+        # the changes are only recorded when the mouse is released
+        self.assertNotIn((ax, ".set"), fig.change_tracker.changes)
+        # the moved artists are drawn on top of the cached background
+        self.assertIsNotNone(selection.blit_background)
+        self.assertTrue(ax.get_animated())
+        self.assertTrue(ax.yaxis.get_animated())
+        selection.button_release_event(MouseEvent("release", fig.canvas, 120, 100))
+
+        # after the drag all artists are drawn normally again
+        self.assertIsNone(selection.blit_background)
+        self.assertFalse(ax.get_animated())
+        self.assertFalse(ax.yaxis.get_animated())
+        self.assertGreater(ax.get_position().x0, start[0, 0])
+        self.assertIn((ax, ".set"), fig.change_tracker.changes)
+
+        # changing the selection during a drag drops the background
+        selection.button_press_event(MouseEvent("press", fig.canvas, 100, 100))
+        selection.on_motion(MouseEvent("move", fig.canvas, 105, 100))
+        fig.canvas.process_frame()
+        self.assertTrue(ax.get_animated())
+        fig.figure_dragger.select_element(fig.axes[1])
+        self.assertIsNone(selection.blit_background)
+        self.assertFalse(ax.get_animated())
+        selection.button_release_event(MouseEvent("release", fig.canvas, 105, 100))
+
+    def test_drag_axes_agg_canvas(self):
+        # get the figure and draw it on a plain agg canvas
+        fig, text = self.run_plot_script()
+        self.addCleanup(fig.set_canvas, fig.canvas)
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.axes[0]
+        select_elements(fig, ax)
+        start = np.array(ax.get_position())
+
+        # drag with shift, the snap lines can only be shown on the qt canvas
+        selection = fig.selection
+        selection.button_press_event(MouseEvent("press", canvas, 100, 100))
+        selection.on_motion(MouseEvent("move", canvas, 123, 117, key="shift"))
+        selection.button_release_event(MouseEvent("release", canvas, 123, 117))
+        self.assertGreater(ax.get_position().x0, start[0, 0])
+        self.assertFalse(ax.get_animated())
+
     def test_axis_limits(self):
         # get the figure
         fig, text = self.run_plot_script()
@@ -0,0 +1,357 @@
+import contextlib
+import io
+
+from matplotlib.backend_bases import MouseEvent
+
+from base_test_class import BaseTest, select_elements
+from pylustrator.change_tracker import (
+    UndoRedo,
+    getReference,
+    getReferenceCache,
+    getBlockIndex,
+    parseCodeLine,
+    resolveReference,
+)
+
+
+class TestChangeTracker(BaseTest):
+    def check_change_index(self, change_tracker):
+        # the index has to list exactly the keys of the stored changes
+        indexed = {
+            (reference_obj, reference_command)
+            for reference_obj, commands in change_tracker.element_changes.items()
+            for reference_command in commands
+        }
+        self.assertEqual(set(change_tracker.changes), indexed)
+
+    def test_change_index(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        change_tracker = fig.change_tracker
+
+        # move the axes a couple of times
+        for i in range(3):
+            self.move_element((-1, 0), fig.axes[0])
+        self.move_element((0, 1), fig.axes[1])
+        self.check_change_index(change_tracker)
+        self.assertIn(fig.axes[0], change_tracker.element_changes)
+        self.assertIn(fig.axes[1], change_tracker.element_changes)
+
+        # removing the changes of one element does not touch the others
+        change_tracker.removeElementChanges(fig.axes[0])
+        self.check_change_index(change_tracker)
+        self.assertNotIn(fig.axes[0], change_tracker.element_changes)
+        self.assertIn(fig.axes[1], change_tracker.element_changes)
+
+        # remove a single change
+        change_tracker.removeChange(fig.axes[1], ".set")
+        self.check_change_index(change_tracker)
+        self.assertNotIn((fig.axes[1], ".set"), change_tracker.changes)
+
+    def test_reference_cache(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        ax = fig.axes[1]
+
+        # resolve references of texts and tick labels
+        label = ax.get_xaxis().get_major_ticks()[1].label1
+        self.assertEqual(
+            getReference(label),
+            "plt.figure(1).axes[1].get_xaxis().get_major_ticks()[1].label1",
+        )
+        first = ax.text(0.1, 0.1, "first")
+        second = ax.text(0.2, 0.2, "second")
+        self.assertEqual(getReference(second), "plt.figure(1).axes[1].texts[1]")
+
+        # removing a text moves the other one, the cached reference has to be updated
+        first.remove()
+        self.assertEqual(getReference(second), "plt.figure(1).axes[1].texts[0]")
+
+        # a unique label references the axes by its label
+        ax.set_label("b")
+        self.assertEqual(getReference(ax), 'plt.figure(1).ax_dict["b"]')
+        self.assertEqual(getReference(second), 'plt.figure(1).ax_dict["b"].texts[0]')
+
+        # when another axes gets the same label the label is not unique anymore
+        fig.axes[2].set_label("b")
+        self.assertEqual(getReference(ax), "plt.figure(1).axes[1]")
+
+        # texts that are not indexed (e.g. of inset axes) do not rebuild the tables on every lookup
+        inset = ax.inset_axes([0.5, 0.5, 0.4, 0.4])
+        inset_text = inset.title
+        cache = getReferenceCache(fig)
+        self.assertIsNone(cache.get_text(inset_text))
+        builds = []
+        build = cache.build
+        cache.build = lambda: (builds.append(1), build())
+        self.assertIsNone(cache.get_text(inset_text))
+        self.assertEqual(builds, [])
+
+        # a new text changes the structure of the figure and is found
+        third = ax.text(0.3, 0.3, "third")
+        self.assertEqual(getReference(third), "plt.figure(1).axes[1].texts[1]")
+        self.assertEqual(builds, [1])
+
+    def test_artist_index(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        ax = fig.axes[0]
+
+        lines = [ax.plot([0, 1], [0, i])[0] for i in range(3)]
+        collections = [ax.scatter([0], [i]) for i in range(3)]
+        offset = len(ax.lines) - 3
+        self.assertEqual(
+            getReference(lines[2]), "plt.figure(1).axes[0].lines[%d]" % (offset + 2)
+        )
+        self.assertEqual(
+            getReference(collections[1]),
+            "plt.figure(1).axes[0].collections[%d]" % (len(ax.collections) - 2),
+        )
+
+        # removing and adding a line keeps the length, the indices still have to be updated
+        lines[0].remove()
+        ax.plot([0, 1], [1, 0])
+        self.assertEqual(
+            getReference(lines[2]), "plt.figure(1).axes[0].lines[%d]" % (offset + 1)
+        )
+        for element in ax.lines:
+            self.assertEqual(
+                getReference(element),
+                "plt.figure(1).axes[0].lines[%d]" % list(ax.lines).index(element),
+            )
+
+    def test_incremental_save(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        change_tracker = fig.change_tracker
+
+        self.move_element((-1, 0), fig.axes[0])
+        self.move_element((0, 1), fig.axes[2])
+        change_tracker.save()
+        self.assertEqual(len(change_tracker.dirty_changes), 0)
+
+        # only the changes of the moved element have to be rendered again
+        self.move_element((1, 0), fig.axes[1])
+        self.assertEqual({k[0] for k in change_tracker.dirty_changes}, {fig.axes[1]})
+        lines = change_tracker.sorted_changes()
+
+        # the incremental output is the same as rendering everything again
+        change_tracker.rendered_signature = None
+        self.assertEqual(lines, change_tracker.sorted_changes())
+
+        # adding an artist renders all changes again
+        signature = change_tracker.rendered_signature
+        fig.axes[0].text(0.5, 0.5, "new text")
+        self.assertEqual(lines, change_tracker.sorted_changes())
+        self.assertNotEqual(signature, change_tracker.rendered_signature)
+
+    def test_save_no_temporary_file(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+
+        self.move_element((-1, 0), fig.axes[0])
+        fig.change_tracker.save()
+
+        # the file is replaced in one step and no temporary file is left behind
+        temporary_files = list(
+            self.filename.absolute().parent.glob(self.filename.name + "*.tmp")
+        )
+        self.assertEqual(temporary_files, [])
+        line, (args, kwargs) = self.check_line_in_file("plt.figure(1).axes[0].set(")
+        self.assertIn("position", kwargs)
+
+    def test_block_index(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        self.move_element((-1, 0), fig.axes[0])
+        fig.change_tracker.save()
+
+        # the index of an unchanged file is reused
+        filename = str(self.filename)
+        block_index = getBlockIndex(filename)
+        self.assertIs(block_index, getBlockIndex(filename))
+        block = block_index.blocks_by_id["plt.figure(1)"]
+        self.assertTrue(
+            block_index.lines[block.start_lineno].startswith(
+                "#% start: automatic generated code from pylustrator"
+            )
+        )
+
+        # changing the file invalidates the index
+        with self.filename.open("a") as fp:
+            fp.write("# a new line\n")
+        self.assertIsNot(block_index, getBlockIndex(filename))
+        self.assertTrue(getBlockIndex(filename).lines[-1].endswith("# a new line\n"))
+
+    def test_parse_code_line(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        ax = fig.axes[1]
+
+        # the line is split into the object, the command, the parameters and the id
+        self.assertEqual(
+            parseCodeLine(
+                'plt.figure(1).axes[1].text(0.5, 0.5, "a")  # id=plt.figure(1).axes[1].texts[0].new'
+            ),
+            (
+                "plt.figure(1).axes[1]",
+                ".text",
+                '(0.5, 0.5, "a")  # id=plt.figure(1).axes[1].texts[0].new',
+                "plt.figure(1).axes[1].texts[0].new",
+            ),
+        )
+        self.assertEqual(
+            parseCodeLine("plt.figure(1).axes[0].get_legend().set(loc=(0.1, 0.2))"),
+            ("plt.figure(1).axes[0].get_legend()", ".set", "(loc=(0.1, 0.2))", None),
+        )
+        self.assertIsNone(parseCodeLine("getattr(plt.figure(1), 'x', None)"))
+
+        # references are resolved to the objects they refer to
+        for element in [fig, ax, ax.get_xaxis().get_label()]:
+            self.assertIs(resolveReference(getReference(element), fig), element)
+        self.assertIs(
+            resolveReference(
+                "plt.figure(1).axes[1].get_xaxis().get_major_ticks()[1]", fig
+            ),
+            ax.get_xaxis().get_major_ticks()[1],
+        )
+        # the generated code defines the ax_dict of the figure
+        fig.ax_dict = {"b": ax}
+        self.assertIs(resolveReference('plt.figure(1).ax_dict["b"]', fig), ax)
+        with self.assertRaises(ValueError):
+            resolveReference("plt.figure(1).axes[0].set_xlim()", fig)
+        with self.assertRaises(IndexError):
+            resolveReference("plt.figure(1).axes[10]", fig)
+
+    def test_edit_history(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        change_tracker = fig.change_tracker
+        values = []
+
+        def add_edit(value, merge_key=None):
+            change_tracker.addEdit(
+                [lambda: values.append(-value), lambda: values.append(value), "Edit"],
+                merge_key=merge_key,
+            )
+
+        # edits of the same property are merged into one undo step
+        add_edit(1, merge_key="a")
+        add_edit(2, merge_key="a")
+        add_edit(3, merge_key="b")
+        self.assertEqual(len(change_tracker.edits), 2)
+        change_tracker.backEdit()
+        change_tracker.backEdit()
+        self.assertEqual(values, [-3, -1])
+        change_tracker.forwardEdit()
+        self.assertEqual(values, [-3, -1, 2])
+
+        # only the newest edits are kept
+        change_tracker.max_edits = 3
+        for i in range(5):
+            add_edit(i)
+        self.assertEqual(len(change_tracker.edits), 3)
+        self.assertEqual(change_tracker.last_edit, 2)
+        change_tracker.backEdit()
+        self.assertEqual(values[-1], -4)
+
+    def test_undo_redo_setters(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        axes = fig.axes[:2]
+        text = axes[0].get_xaxis().get_label()
+        text.set_text("label")
+        fontsize = text.get_fontsize()
+
+        with UndoRedo(axes + [text], "Edit"):
+            for ax in axes:
+                ax.set_xscale("log")
+            text.set_fontsize(20)
+
+        # undo and redo call the setters directly without output
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            fig.change_tracker.backEdit()
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual([ax.get_xscale() for ax in axes], ["linear", "linear"])
+        self.assertEqual(text.get_fontsize(), fontsize)
+
+        fig.change_tracker.forwardEdit()
+        self.assertEqual([ax.get_xscale() for ax in axes], ["log", "log"])
+        self.assertEqual(text.get_fontsize(), 20)
+        self.assertIn((axes[0], ".set"), fig.change_tracker.changes)
+
+    def test_merge_edits_of_different_setters(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        ax = fig.axes[0]
+        x_ticks = list(ax.get_xticks(minor=True))
+        y_ticks = list(ax.get_yticks(minor=True))
+
+        # two edits of the same elements set different minor ticks
+        with UndoRedo([ax], "Axes Minor Ticks"):
+            ax.set_xticks([0.5, 1.5], minor=True)
+        with UndoRedo([ax], "Axes Minor Ticks"):
+            ax.set_yticks([0.25], minor=True)
+        self.assertEqual(len(fig.change_tracker.edits), 1)
+
+        # the merged edit restores both setters
+        fig.change_tracker.backEdit()
+        self.assertEqual(list(ax.get_xticks(minor=True)), x_ticks)
+        self.assertEqual(list(ax.get_yticks(minor=True)), y_ticks)
+        fig.change_tracker.forwardEdit()
+        self.assertEqual(list(ax.get_xticks(minor=True)), [0.5, 1.5])
+        self.assertEqual(list(ax.get_yticks(minor=True)), [0.25])
+
+    def test_transaction(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        change_tracker = fig.change_tracker
+        ax = fig.axes[0]
+        select_elements(fig, ax)
+        calls = []
+        describe = change_tracker.get_describtion_string
+
+        def get_describtion_string(element, **kwargs):
+            calls.append(element)
+            return describe(element, **kwargs)
+
+        change_tracker.get_describtion_string = get_describtion_string
+
+        # the steps of a move are collected in a transaction
+        fig.selection.start_move()
+        for i in range(5):
+            fig.selection.addOffset((1, 0), fig.selection.dir)
+        fig.selection.has_moved = True
+        self.assertEqual(calls, [])
+        self.assertNotIn((ax, ".set"), change_tracker.changes)
+
+        # and recorded once for the final position when the move ends
+        fig.selection.end_move()
+        self.assertEqual(calls, [ax])
+        command_obj, command = change_tracker.changes[ax, ".set"]
+        self.assertIn("%.4f" % ax.get_position().x0, command)
+        self.assertIsNone(change_tracker.transaction)
+
+    def test_transaction_without_release(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        change_tracker = fig.change_tracker
+        ax = fig.axes[0]
+        select_elements(fig, ax)
+        change_tracker.saved = True
+        edit_count = len(change_tracker.edits)
+
+        # the selection is cleared before the release of the press
+        x, y = ax.transAxes.transform((0.5, 0.5))
+        fig.selection.button_press_event(MouseEvent("press", fig.canvas, x, y))
+        fig.selection.clear_targets()
+        self.assertIsNone(change_tracker.transaction)
+
+        # later edits are still recorded
+        with UndoRedo([ax], "Axes Limits"):
+            ax.set_xlim(0, 2)
+            change_tracker.addChange(ax, ".set_xlim(0, 2)")
+        self.assertEqual(len(change_tracker.edits), edit_count + 1)
+        self.assertIn("xlim", change_tracker.changes[ax, ".set"][1])
+        self.assertFalse(change_tracker.saved)
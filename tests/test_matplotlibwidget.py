@@ -0,0 +1,183 @@
+import matplotlib
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.backend_bases import KeyEvent
+from qtpy import QtWidgets
+
+from base_test_class import BaseTest
+
+
+class StaleDuringDraw(Artist):
+    """an artist that marks itself as stale when it is drawn"""
+
+    def draw(self, renderer):
+        self.stale = True
+
+
+class TestMatplotlibWidget(BaseTest):
+    def test_schedule_draw(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        canvas = fig.canvas
+        # handle the pending draws of the previous windows of the figure
+        QtWidgets.QApplication.processEvents()
+        draws = []
+        canvas.mpl_connect("draw_event", lambda event: draws.append(event))
+
+        # a fast figure is drawn once in the next iteration of the event loop
+        canvas.draw_duration = 0.001
+        for i in range(5):
+            canvas.schedule_draw()
+        self.assertEqual(draws, [])
+        self.assertEqual(canvas.timer.interval(), 0)
+        QtWidgets.QApplication.processEvents()
+        self.assertEqual(len(draws), 1)
+        self.assertFalse(canvas.timer.isActive())
+
+        # a slow figure waits for the duration of a draw after the last draw
+        canvas.draw_duration = 10
+        canvas.schedule_draw()
+        self.assertTrue(canvas.timer.isActive())
+        self.assertGreater(canvas.timer.interval(), 200)
+        self.assertLessEqual(canvas.timer.interval(), canvas.max_draw_delay * 1000)
+        # a direct draw handles the pending request
+        canvas.draw()
+        self.assertFalse(canvas.timer.isActive())
+        self.assertEqual(len(draws), 2)
+        self.assertLess(canvas.draw_duration, 10)
+
+    def test_no_draw_request_while_drawing(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        canvas = fig.canvas
+        QtWidgets.QApplication.processEvents()
+
+        # in interactive mode stale artists request a draw of the figure
+        matplotlib.interactive(True)
+        self.addCleanup(matplotlib.interactive, False)
+
+        # artists that become stale during the draw do not request another draw
+        fig.axes[0].add_artist(StaleDuringDraw())
+        canvas.draw()
+        self.assertFalse(canvas.timer.isActive())
+
+        # outside of a draw the request is scheduled
+        canvas.draw_idle()
+        self.assertTrue(canvas.timer.isActive())
+
+    def test_draw_requests_merged(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        canvas = fig.canvas
+        # handle the pending draws of the previous windows of the figure
+        QtWidgets.QApplication.processEvents()
+        canvas.draw()
+        canvas.draw_duration = 0.001
+        draws = []
+        canvas.mpl_connect("draw_event", lambda event: draws.append(event))
+
+        # move an axes with the keyboard and undo it
+        fig.figure_dragger.select_element(fig.axes[0])
+        fig.figure_dragger.selection.keyPressEvent(
+            KeyEvent("key_press_event", canvas, "right")
+        )
+        saved_draws = canvas.saved_draws
+        fig.figure_dragger.undo()
+
+        # the redraws of the undo are merged into one draw
+        self.assertEqual(draws, [])
+        self.assertGreater(canvas.saved_draws, saved_draws)
+        QtWidgets.QApplication.processEvents()
+        self.assertEqual(len(draws), 1)
+
+    def test_render_cache_option(self):
+        # the render cache is off by default
+        fig, text = self.run_plot_script()
+        self.assertFalse(fig.canvas.render_cache)
+
+        # and can be activated when starting pylustrator
+        self.filename.write_bytes(
+            text.replace(
+                b"pylustrator.start()", b"pylustrator.start(render_cache=True)"
+            )
+        )
+        fig, text = self.run_plot_script()
+        self.assertTrue(fig.canvas.render_cache)
+
+    def test_render_cache(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        canvas = fig.canvas
+        QtWidgets.QApplication.processEvents()
+        # separate the axes and the figure text
+        fig.subplots_adjust(wspace=0.5)
+        fig.texts[0].set_position((0.01, 0.01))
+        canvas.render_cache = True
+        canvas.draw()
+
+        # count the draws of an unchanged axes
+        draws = []
+        axes_draw = fig.axes[2].draw
+        fig.axes[2].draw = lambda renderer: (draws.append(1), axes_draw(renderer))
+
+        # change a text in the first axes
+        fig.axes[0].texts[0].set_position((0.2, 0.7))
+        canvas.draw()
+        self.assertEqual(draws, [])
+        cached_image = np.array(canvas.buffer_rgba())
+
+        # the image is the same as the one of a full draw
+        canvas.render_cache = False
+        canvas.draw()
+        self.assertEqual(len(draws), 1)
+        np.testing.assert_array_equal(cached_image, np.array(canvas.buffer_rgba()))
+        del fig.axes[2].draw
+
+    def test_reduced_detail(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        canvas = fig.canvas
+        QtWidgets.QApplication.processEvents()
+        x = np.linspace(0, 1, 100000)
+        y = np.random.rand(len(x))
+        (line,) = fig.axes[0].plot(x, y)
+        scatter = fig.axes[1].scatter(x, y, c=y)
+        canvas.draw()
+
+        # without interaction everything is drawn in full detail
+        with canvas.reduced_detail():
+            self.assertNotIn("draw", line.__dict__)
+
+        canvas.begin_interaction()
+        with canvas.reduced_detail():
+            # the line is drawn by a copy that keeps its extremes with much less points
+            proxy = line.draw.__self__
+            self.assertIsNot(proxy, line)
+            self.assertLess(len(proxy.get_xdata()), len(x) / 10)
+            self.assertEqual(proxy.get_ydata().max(), y.max())
+            self.assertEqual(proxy.get_ydata().min(), y.min())
+            # the scatter keeps one point per cell with its color value
+            proxy = scatter.draw.__self__
+            count = len(proxy.get_offsets())
+            self.assertLess(count, len(x))
+            self.assertEqual(len(proxy.get_array()), count)
+        self.assertNotIn("draw", line.__dict__)
+        self.assertNotIn("draw", scatter.__dict__)
+
+        # a draw with less detail does not change the artists or mark them stale
+        canvas.draw()
+        np.testing.assert_array_equal(line.get_xdata(), x)
+        np.testing.assert_array_equal(scatter.get_array(), y)
+        self.assertEqual(len(scatter.get_offsets()), len(x))
+        self.assertFalse(line.stale)
+        self.assertFalse(fig.axes[0].stale)
+        self.assertFalse(fig.stale)
+
+        # the end of the interaction draws in full detail
+        draws = []
+        canvas.mpl_connect("draw_event", lambda event: draws.append(event))
+        canvas.draw_duration = 0.001
+        canvas.end_interaction()
+        self.assertFalse(canvas.interacting)
+        QtWidgets.QApplication.processEvents()
+        self.assertEqual(len(draws), 1)
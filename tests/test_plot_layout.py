@@ -0,0 +1,45 @@
+import numpy as np
+from matplotlib.backend_bases import MouseEvent
+from qtpy import QtWidgets
+
+from base_test_class import BaseTest
+
+
+class TestPlotLayout(BaseTest):
+    def test_zoom_preview(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        QtWidgets.QApplication.processEvents()
+        layout = fig.window.plot_layout.canvas_canvas
+        canvas = fig.canvas
+        canvas.draw()
+        dpi = fig.get_dpi()
+        # the figure is shared with the other tests
+        self.addCleanup(fig.set_dpi, dpi)
+        size = fig.get_size_inches()
+        draws = []
+        canvas.mpl_connect("draw_event", lambda event: draws.append(event))
+
+        # zoom in with the mouse wheel
+        layout.control_modifier = True
+        for i in range(3):
+            layout.scroll_event(MouseEvent("scroll_event", canvas, 0, 0, step=1))
+
+        # the last image is shown scaled without drawing the figure
+        self.assertEqual(draws, [])
+        self.assertEqual(fig.get_dpi(), dpi)
+        self.assertEqual(canvas.preview_dpi, dpi + 30)
+        w, h = canvas.get_width_height()
+        hint = canvas.sizeHint()
+        self.assertAlmostEqual(hint.width(), w * (dpi + 30) / dpi, delta=1)
+        self.assertAlmostEqual(hint.height(), h * (dpi + 30) / dpi, delta=1)
+        canvas.grab()
+        self.assertTrue(layout.zoom_timer.isActive())
+
+        # when the zooming stops the figure is drawn at the new dpi
+        layout.applyZoom()
+        QtWidgets.QApplication.processEvents()
+        self.assertEqual(fig.get_dpi(), dpi + 30)
+        self.assertIsNone(canvas.preview_dpi)
+        self.assertGreaterEqual(len(draws), 1)
+        np.testing.assert_allclose(fig.get_size_inches(), size, atol=0.02)
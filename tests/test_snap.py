@@ -0,0 +1,251 @@
+import numpy as np
+from matplotlib.backend_bases import MouseEvent
+
+from base_test_class import BaseTest
+from pylustrator.snap import (
+    DIR_X0,
+    DIR_X1,
+    DIR_Y0,
+    DIR_Y1,
+    SnapEngine,
+    SnapSameBorder,
+    TargetWrapper,
+    checkSnaps,
+    getBorderNeighbors,
+    getSnaps,
+    getSpatialIndex,
+    invertedTransform,
+)
+
+
+class TestSnap(BaseTest):
+    def check_engine(self, snaps, engine):
+        # the engine has to give the same result as evaluating every snap
+        self.assertEqual(engine.checkSnaps(), checkSnaps(snaps))
+        distances = engine.getDistances()
+        self.border_found |= np.isfinite(distances[engine.border_index]).any()
+        for index, snap in enumerate(snaps):
+            for dim in range(2):
+                expected = snap.getDistance(dim)
+                if np.isfinite(expected):
+                    self.assertAlmostEqual(distances[index, dim], expected)
+                else:
+                    self.assertFalse(np.isfinite(distances[index, dim]))
+
+    def test_snap_engine_axes(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        fig.canvas.draw()
+        ax = fig.axes[1]
+        start = ax.get_position().bounds
+        self.border_found = False
+
+        all_dirs = DIR_X0 | DIR_X1 | DIR_Y0 | DIR_Y1
+        for dir in [all_dirs, DIR_X0 | DIR_Y0, DIR_X1 | DIR_Y1]:
+            snaps = getSnaps([TargetWrapper(ax)], dir)
+            self.assertTrue(any(isinstance(snap, SnapSameBorder) for snap in snaps))
+            engine = SnapEngine(snaps)
+            # move the axes around the positions where snaps apply
+            for dx in np.linspace(-0.05, 0.05, 7):
+                for dy in np.linspace(-0.05, 0.05, 5):
+                    ax.set_position([start[0] + dx, start[1] + dy, start[2], start[3]])
+                    self.check_engine(snaps, engine)
+            engine.checkSnapsActive()
+            engine.remove()
+            self.assertEqual(engine.snaps, [])
+            ax.set_position(start)
+        self.assertTrue(self.border_found)
+
+    def test_snap_engine_text(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        fig.canvas.draw()
+        label = fig.axes[0].get_xaxis().get_label()
+        label.set_text("label")
+        fig.canvas.draw()
+        target = fig.axes[0].texts[0]
+        self.border_found = False
+
+        for element in [label, target]:
+            snaps = getSnaps([TargetWrapper(element)], 0)
+            self.assertTrue(len(snaps))
+            engine = SnapEngine(snaps)
+            x, y = element.get_position()
+            for dx in [-0.1, 0, 0.1]:
+                element.set_position((x + dx, y))
+                self.check_engine(snaps, engine)
+            element.set_position((x, y))
+            engine.remove()
+
+    def test_extent_cache(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        fig.canvas.draw()
+        ax = fig.axes[0]
+        target = TargetWrapper(ax)
+        extent = target.get_extent()
+
+        # the cached extent follows changes of the dpi
+        fig.set_dpi(fig.get_dpi() * 2)
+        np.testing.assert_allclose(target.get_extent(), np.array(extent) * 2)
+        fig.set_dpi(fig.get_dpi() / 2)
+        np.testing.assert_allclose(target.get_extent(), extent)
+
+        # and of the position that is not set through set_positions
+        ax.set_position([0.1, 0.1, 0.3, 0.3])
+        expected = fig.transFigure.transform([[0.1, 0.1], [0.4, 0.4]]).ravel()
+        np.testing.assert_allclose(target.get_extent(), expected)
+
+        # a text in data coordinates moves when the limits of the axes change
+        text = ax.text(0.5, 0.5, "text", bbox=dict(alpha=0))
+        fig.canvas.draw()
+        target = TargetWrapper(text)
+        x0 = target.get_extent()[0]
+        ax.set_xlim(ax.get_xlim()[0] - 1, ax.get_xlim()[1] - 1)
+        fig.canvas.draw()
+        self.assertGreater(target.get_extent()[0], x0)
+        # the cached extent is reused as long as nothing changed
+        self.assertIs(target.get_extent(), target.get_extent())
+
+    def test_transform_points(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        fig.canvas.draw()
+        ax = fig.axes[0]
+        target = TargetWrapper(ax.texts[0])
+        points = [np.array([0.1, 0.2]), np.array([0.5, 0.7]), np.array([1.0, 0.0])]
+
+        # all points are transformed at once and back
+        transformed = target.transform_points(points)
+        self.assertEqual(len(transformed), 3)
+        for point, expected in zip(transformed, points):
+            np.testing.assert_allclose(
+                point, target.get_transform().transform(expected)
+            )
+        back = target.transform_inverted_points(transformed)
+        np.testing.assert_allclose(back, points)
+
+        # the inverse is cached until the transform changes
+        transform = ax.transData
+        inverted = invertedTransform(transform)
+        self.assertIs(invertedTransform(transform), inverted)
+        ax.set_xlim(ax.get_xlim()[0] - 1, ax.get_xlim()[1])
+        self.assertIsNot(invertedTransform(transform), inverted)
+        point = transform.transform((0.5, 0.5))
+        np.testing.assert_allclose(
+            invertedTransform(transform).transform(point), (0.5, 0.5)
+        )
+
+        # a log scale only changes the non-affine part of the scale transform
+        transform = ax.transScale
+        np.testing.assert_allclose(
+            invertedTransform(transform).transform((100, 1)), (100, 1)
+        )
+        ax.set_xscale("log")
+        point = transform.transform((100, 1))
+        np.testing.assert_allclose(point, (2, 1))
+        np.testing.assert_allclose(
+            invertedTransform(transform).transform(point), (100, 1)
+        )
+        ax.set_xscale("linear")
+        np.testing.assert_allclose(
+            invertedTransform(transform).transform((100, 1)), (100, 1)
+        )
+
+    def test_picked_element(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        fig.canvas.draw()
+
+        dragger = fig.figure_dragger
+
+        def pick(element, event, picked=None):
+            # search all artists without skipping any
+            for child in sorted(element.get_children(), key=lambda x: x.get_zorder()):
+                label = child.get_label()
+                if (
+                    child.get_visible()
+                    and child.contains(event)[0]
+                    and dragger.is_selectable(element, child)
+                    and not (isinstance(label, str) and label.startswith("_"))
+                ):
+                    picked = child
+                picked = pick(child, event, picked)
+            return picked
+
+        # the search that skips artists picks the same elements
+        width, height = fig.canvas.get_width_height()
+        for x in np.linspace(0, width, 23):
+            for y in np.linspace(0, height, 17):
+                event = MouseEvent("pick", fig.canvas, x, y)
+                picked, _ = dragger.get_picked_element(event)
+                self.assertIs(picked, pick(fig, event))
+
+    def test_border_neighbors(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        grid = [
+            [fig.add_axes([0.1 + x * 0.3, 0.1 + y * 0.3, 0.2, 0.2]) for x in range(3)]
+            for y in range(3)
+        ]
+        neighbors = getBorderNeighbors(sum(grid, []))
+
+        # only the axes directly next to each other are neighbors
+        self.assertEqual(
+            set(neighbors[grid[1][1]]),
+            {grid[0][1], grid[2][1], grid[1][0], grid[1][2]},
+        )
+        self.assertEqual(set(neighbors[grid[0][0]]), {grid[0][1], grid[1][0]})
+
+        # the border snaps only use the space between neighbors
+        snaps = getSnaps([TargetWrapper(grid[0][0])], DIR_X0 | DIR_Y0)
+        neighbors = getBorderNeighbors([ax for ax in fig.axes if ax is not grid[0][0]])
+        borders = [snap for snap in snaps if isinstance(snap, SnapSameBorder)]
+        for snap in borders:
+            self.assertIn(snap.ax_target2.target, neighbors[snap.ax_target.target])
+        for snap in snaps:
+            snap.remove()
+
+    def test_snap_path_pool(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        fig.canvas.draw()
+        snaps = getSnaps([TargetWrapper(fig.axes[0])], DIR_X0 | DIR_Y0)
+        # no line objects are created for snaps that are not shown
+        self.assertTrue(all(snap.draw_path is None for snap in snaps))
+
+        # a hidden snap gives its line object to the next snap that is shown
+        snaps[0].show()
+        draw_path = snaps[0].draw_path
+        self.assertIsNotNone(draw_path)
+        snaps[0].hide()
+        self.assertIsNone(snaps[0].draw_path)
+        self.assertFalse(draw_path.isVisible())
+        snaps[1].show()
+        self.assertIs(snaps[1].draw_path, draw_path)
+        self.assertTrue(draw_path.isVisible())
+        for snap in snaps:
+            snap.remove()
+
+    def test_spatial_index(self):
+        # get the figure
+        fig, text = self.run_plot_script()
+        fig.canvas.draw()
+        ax = fig.axes[1]
+        index = getSpatialIndex(fig)
+
+        # the axes is found at its center
+        x, y = TargetWrapper(ax).get_extent()[:2]
+        self.assertIn(ax, index.query(x + 10, y + 10))
+        event = MouseEvent("pick", fig.canvas, x + 10, y + 10)
+        picked, _ = fig.figure_dragger.get_picked_element(event)
+        self.assertIs(picked, ax)
+
+        # after moving the axes, the index uses the new position
+        x1 = TargetWrapper(ax).get_extent()[2]
+        self.move_element((-50, 0), ax)
+        self.assertNotIn(ax, index.query(x1 - 10, y + 10))
+        self.assertIn(ax, index.query(x - 40, y + 10))
+        event = MouseEvent("pick", fig.canvas, x - 40, y + 10)
+        picked, _ = fig.figure_dragger.get_picked_element(event)
+        self.assertIs(picked, ax)